@@ -0,0 +1,218 @@
+"""
+Pluggable audio I/O.
+
+Components open their streams through get_audio_backend(), which is the
+`sounddevice` module unless another backend was installed with
+set_audio_backend(). A backend only needs sounddevice's
+InputStream(samplerate, channels, blocksize, dtype, callback) and
+OutputStream(samplerate, channels, dtype) with start/stop/close (and
+write/abort for output).
+
+VirtualAudioDevice is such a backend without hardware: the "mic" plays
+queued arrays or WAV files (then silence) into the callback at real-time
+pace, and the "speaker" records what it is given. It makes the voice
+pipeline runnable on headless hosts (see benchmarks/replay.py).
+"""
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+_backend = None
+
+
+def get_audio_backend():
+    """Current backend (sounddevice by default, imported on first use)"""
+    global _backend
+    if _backend is None:
+        import sounddevice
+        _backend = sounddevice
+    return _backend
+
+
+def set_audio_backend(backend):
+    """Install a backend; call before any stream is opened"""
+    global _backend
+    _backend = backend
+
+
+def read_wav(path):
+    """16-bit PCM WAV -> (float32 (frames, channels), sample_rate)"""
+    with wave.open(str(path), "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV is supported")
+        channels = wf.getnchannels()
+        sample_rate = wf.getframerate()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return pcm.reshape(-1, channels).astype(np.float32) / 32768.0, sample_rate
+
+
+# --------------------------------------------------
+# Virtual device
+# --------------------------------------------------
+
+class VirtualAudioDevice:
+    """
+    Array/file-backed stand-in for the sounddevice module.
+
+    `speed` scales the pace of both directions: 1.0 is real time, 2.0
+    twice as fast. Capture never runs unpaced, because consumers (like
+    VADSegmenter) drop blocks when they fall behind, as with a real mic.
+    With `speed=None` playback returns immediately instead of taking the
+    audio's duration.
+    """
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.outputs = []   # (audio, sample_rate) handed to any output stream
+        self._clips = queue.Queue()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._lock = threading.Lock()   # _clips and _idle change together
+
+    # ---- sounddevice API --------------------------
+
+    def InputStream(self, samplerate, channels=1, blocksize=None, dtype="float32",
+                    callback=None, **kwargs):
+        return _VirtualInputStream(self, samplerate, channels, blocksize, callback)
+
+    def OutputStream(self, samplerate, channels=1, dtype="float32", **kwargs):
+        return _VirtualOutputStream(self, samplerate, channels)
+
+    # ---- driving the device -----------------------
+
+    def play_input(self, audio, lead_in_s=0.0, sample_rate=None):
+        """
+        Queue audio for the mic: float32 (frames,) or (frames, channels),
+        resampled to the capturing stream's rate if `sample_rate` is given
+        (else assumed to match it). `lead_in_s` of silence is played first.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        with self._lock:
+            self._idle.clear()
+            self._clips.put((audio, lead_in_s, sample_rate))
+
+    def play_input_file(self, path, lead_in_s=0.0):
+        """Queue a WAV file (any sample rate)"""
+        audio, sample_rate = read_wav(path)
+        self.play_input(audio, lead_in_s, sample_rate)
+
+    def wait_input(self, timeout=None):
+        """Block until every queued clip has been captured"""
+        return self._idle.wait(timeout)
+
+    def take_output(self):
+        """(audio, sample_rate) of every write so far; clears the record"""
+        outputs, self.outputs = self.outputs, []
+        return outputs
+
+    def output_seconds(self):
+        return sum(len(audio) / sample_rate for audio, sample_rate in self.outputs)
+
+    def _next_clip(self):
+        with self._lock:
+            try:
+                return self._clips.get_nowait()
+            except queue.Empty:
+                self._idle.set()
+                return None
+
+
+class _VirtualInputStream:
+    def __init__(self, device, samplerate, channels, blocksize, callback):
+        self.device = device
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize or int(samplerate * 0.02)
+        self.callback = callback
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        block_s = self.blocksize / self.samplerate / (self.device.speed or 1.0)
+        silence = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        pending = np.zeros((0, self.channels), dtype=np.float32)
+        next_time = time.perf_counter()
+
+        while self._running.is_set():
+            if not len(pending):
+                clip = self.device._next_clip()
+                if clip is not None:
+                    audio, lead_in_s, sample_rate = clip
+                    if sample_rate and sample_rate != self.samplerate:
+                        audio = _resample(audio, sample_rate, self.samplerate)
+                    lead_in = np.zeros((int(lead_in_s * self.samplerate), self.channels), dtype=np.float32)
+                    pending = np.concatenate([lead_in, audio[:, :self.channels]])
+
+            if len(pending):
+                block = pending[:self.blocksize]
+                pending = pending[self.blocksize:]
+                if len(block) < self.blocksize:
+                    block = np.concatenate([block, silence[len(block):]])
+            else:
+                block = silence
+
+            if self.callback is not None:
+                self.callback(block.copy(), self.blocksize, None, None)
+
+            # Absolute schedule, so callback time does not add drift
+            next_time += block_s
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def _resample(audio, from_rate, to_rate):
+    """Linear-interpolation resampling of (frames, channels) audio"""
+    frames = int(round(len(audio) * to_rate / from_rate))
+    src = np.arange(len(audio)) / from_rate
+    dst = np.arange(frames) / to_rate
+    return np.stack(
+        [np.interp(dst, src, audio[:, c]) for c in range(audio.shape[1])], axis=1
+    ).astype(np.float32)
+
+
+class _VirtualOutputStream:
+    def __init__(self, device, samplerate, channels):
+        self.device = device
+        self.samplerate = samplerate
+        self.channels = channels
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def abort(self):
+        pass
+
+    def close(self):
+        pass
+
+    def write(self, data):
+        data = np.asarray(data, dtype=np.float32).reshape(-1, self.channels)
+        self.device.outputs.append((data[:, 0] if self.channels == 1 else data, self.samplerate))
+        if self.device.speed:
+            # A real device blocks for (roughly) the duration of the audio
+            time.sleep(len(data) / self.samplerate / self.device.speed)
@@ -0,0 +1,143 @@
+"""
+Compare LLM backends: time-to-first-token and decode tokens/sec.
+
+    python benchmarks/llm_backends.py --backends cpu-fp32 cpu-int8 onnx
+    python benchmarks/llm_backends.py --json results.json
+
+Each backend is loaded in turn, warmed up once, then runs the same
+prompts with greedy decoding so the numbers are comparable.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from threading import Thread
+
+from transformers import TextIteratorStreamer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from run_qwen_teacher import load_model, SYSTEM_PROMPT
+from llm_session import build_prompt
+
+PROMPTS = [
+    "What is photosynthesis?",
+    "Why is the sky blue?",
+    "Explain addition of fractions with an example.",
+    "സൂര്യൻ എന്താണ്?",
+]
+
+
+def run_prompt(model, tokenizer, text, max_new_tokens):
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": text},
+    ]
+    inputs = tokenizer(
+        build_prompt(tokenizer, messages), return_tensors="pt"
+    ).to(model.device)
+
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True
+    )
+    result = {}
+
+    def generate():
+        result["output"] = model.generate(
+            **inputs,
+            streamer=streamer,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+        )
+
+    start = time.perf_counter()
+    thread = Thread(target=generate)
+    thread.start()
+
+    first_token = None
+    for chunk in streamer:
+        if first_token is None and chunk:
+            first_token = time.perf_counter()
+    thread.join()
+    end = time.perf_counter()
+
+    prompt_tokens = inputs["input_ids"].shape[-1]
+    new_tokens = result["output"].shape[-1] - prompt_tokens
+    first_token = first_token or end
+    decode_time = end - first_token
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "new_tokens": new_tokens,
+        "ttft_s": first_token - start,
+        "tokens_per_s": (new_tokens - 1) / decode_time if decode_time > 0 else 0.0,
+        "total_s": end - start,
+    }
+
+
+def benchmark(backend, max_new_tokens, repeats):
+    load_start = time.perf_counter()
+    model, tokenizer = load_model(backend=backend)
+    load_time = time.perf_counter() - load_start
+
+    run_prompt(model, tokenizer, "Hello!", 8)  # warm-up
+
+    runs = [
+        run_prompt(model, tokenizer, prompt, max_new_tokens)
+        for _ in range(repeats)
+        for prompt in PROMPTS
+    ]
+
+    del model
+    gc.collect()
+
+    def mean(key):
+        return sum(r[key] for r in runs) / len(runs)
+
+    return {
+        "backend": backend,
+        "load_s": load_time,
+        "ttft_s": mean("ttft_s"),
+        "tokens_per_s": mean("tokens_per_s"),
+        "total_s": mean("total_s"),
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--backends", nargs="+", default=["cpu-fp32", "cpu-int8", "onnx"]
+    )
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--json", help="write full results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends:
+        print(f"\n=== {backend} ===")
+        try:
+            results.append(benchmark(backend, args.max_new_tokens, args.repeats))
+        except Exception as e:
+            print(f"{backend}: skipped ({e})")
+
+    print("\n" + "-" * 60)
+    print(f"{'backend':<10} {'load s':>8} {'TTFT s':>8} {'tok/s':>8} {'total s':>8}")
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['load_s']:>8.1f} {r['ttft_s']:>8.2f} "
+            f"{r['tokens_per_s']:>8.1f} {r['total_s']:>8.2f}"
+        )
+    print("-" * 60)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
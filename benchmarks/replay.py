@@ -0,0 +1,299 @@
+"""
+Headless end-to-end benchmark: replay recorded utterances through the
+voice pipeline on a virtual audio device.
+
+    python benchmarks/replay.py --corpus corpus/ --json replay.json
+    python benchmarks/replay.py --corpus corpus/ --stages stt tts --speed 2
+    python benchmarks/replay.py --corpus corpus/ --compare baseline.json
+
+The corpus is a directory of 16-bit PCM WAV files, grouped by language:
+corpus/en/*.wav, corpus/ml/*.wav (any sample rate; every clip must
+contain speech, or the VAD never fires). Each clip is a fresh
+conversation: virtual mic -> Silero VAD -> HybridSTT (live routing) ->
+Qwen (streamed) -> Piper -> virtual speaker, exactly as in
+run_teacherbot_voice.py, timed by latency_tracer.
+
+Reported per stage: real-time factors (VAD, offline STT pass, TTS),
+latency percentiles from the VAD endpoint (STT, time to first token,
+first audio out, whole turn), LLM first-token time and tokens/s, language-ID
+accuracy, model load time and peak RSS. --json writes everything
+(including per-clip records) for comparison between runs.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from resource_manager import resources
+resources.configure()
+
+import numpy as np
+
+from audio_io import VirtualAudioDevice, read_wav, set_audio_backend
+from latency_tracer import tracer
+from model_registry import registry
+
+# Headline rows of the printed table (metric, label)
+REPORT = [
+    ("vad_rtf", "VAD RTF"),
+    ("stt_offline_rtf", "STT RTF (offline)"),
+    ("tts_rtf", "TTS RTF"),
+    ("lid_ms", "LID ms"),
+    ("stt_ms", "STT ms (endpoint)"),
+    ("llm_first_token_ms", "LLM first token ms"),
+    ("llm_ttft_ms", "LLM TTFT ms"),
+    ("llm_tokens_per_s", "LLM tokens/s"),
+    ("first_audio_ms", "first audio ms"),
+    ("turn_ms", "turn ms"),
+]
+
+
+class _NoSpeech:
+    """SpeechPipeline stand-in when the tts stage is skipped"""
+
+    epoch = 0
+
+    def submit(self, text, language=None, epoch=None):
+        pass
+
+    def wait(self):
+        pass
+
+    def take_spoken(self):
+        return ""
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux /proc), else None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def load_corpus(corpus_dir):
+    from whisper_stt.src.audio_utils import to_mono_float32
+
+    clips = []
+    for path in sorted(Path(corpus_dir).rglob("*.wav")):
+        audio, sample_rate = read_wav(path)
+        clips.append({
+            "name": str(path.relative_to(corpus_dir)),
+            "language": path.parent.name if path.parent != Path(corpus_dir) else None,
+            "audio": to_mono_float32(audio, sample_rate),
+        })
+    if not clips:
+        raise SystemExit(f"No .wav files under {corpus_dir}")
+    return clips
+
+
+def summarize(records):
+    """metric -> {count, mean, p50, p95, p99} over all clips"""
+    values = {}
+    for record in records:
+        for name, value in record["metrics"].items():
+            values.setdefault(name, []).append(value)
+
+    summary = {}
+    for name, items in sorted(values.items()):
+        p50, p95, p99 = np.percentile(items, [50, 95, 99])
+        summary[name] = {
+            "count": len(items), "mean": float(np.mean(items)),
+            "p50": float(p50), "p95": float(p95), "p99": float(p99),
+        }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    summary = report["summary"]
+    print("\n" + "-" * 72)
+    header = f"{'stage':<20} {'p50':>10} {'p95':>10} {'p99':>10}"
+    print(header + (f" {'base p50':>10} {'change':>8}" if baseline else ""))
+    for name, label in REPORT:
+        if name not in summary:
+            continue
+        s = summary[name]
+        line = f"{label:<20} {s['p50']:>10.3f} {s['p95']:>10.3f} {s['p99']:>10.3f}"
+        base = (baseline or {}).get("summary", {}).get(name)
+        if base:
+            change = (s["p50"] - base["p50"]) / base["p50"] if base["p50"] else 0.0
+            line += f" {base['p50']:>10.3f} {change:>+8.0%}"
+        print(line)
+    print("-" * 72)
+    decoding = report["whisper_decoding"]
+    print(f"Whisper {decoding['decoding']} decoding: beam fallback on "
+          f"{decoding['beam_fallbacks']}/{decoding['greedy_decodes']} decodes")
+    if report["language_accuracy"] is not None:
+        print(f"Language ID accuracy: {report['language_accuracy']:.0%}")
+    rss = report["rss_after_load_mb"]
+    print(f"Model load: {report['load_s']:.1f}s | "
+          f"RSS after load: {f'{rss:.0f} MB' if rss is not None else 'n/a'} | "
+          f"peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", required=True, help="directory of en/ ml/ WAV files")
+    parser.add_argument("--stages", nargs="+", default=["stt", "llm", "tts"],
+                        choices=["stt", "llm", "tts"],
+                        help="stt always runs; without llm, tts speaks the transcript")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="virtual device pace (1.0 = real time)")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--no-offline-stt", action="store_true",
+                        help="skip the extra offline STT pass used for the STT RTF")
+    parser.add_argument("--json", help="write the full report to this file")
+    parser.add_argument("--compare", help="earlier --json report to compare against")
+    args = parser.parse_args()
+
+    # Every stream opened from here on uses the virtual device
+    device = VirtualAudioDevice(speed=args.speed)
+    set_audio_backend(device)
+
+    tracer.enabled = True
+    tracer.jsonl_path = None
+    tracer.print_turns = False
+    tracer.summary_every = 0
+
+    use_llm = "llm" in args.stages
+    use_tts = "tts" in args.stages
+    clips = load_corpus(args.corpus)
+
+    names = ["hybrid_stt", "silero_vad"]
+    names += ["qwen", "qwen_draft"] if use_llm else []
+    names += ["piper_tts"] if use_tts else []
+
+    load_start = time.perf_counter()
+    registry.preload(names)
+    load_s = time.perf_counter() - load_start
+    rss_after_load = current_rss_mb()
+    registry.report()
+
+    from whisper_stt.src.stt_interface import listen_and_transcribe
+    from prompts import SYSTEM_PROMPT, MAX_HISTORY_TOKENS
+    from run_teacherbot_voice import respond
+    from text_to_multi_speech.src.speech_pipeline import SpeechPipeline
+    from text_to_multi_speech.src.text_chunker import TextChunker
+    from llm_session import ChatSession
+    from conversation_memory import ConversationMemory
+
+    stt = registry.get("hybrid_stt")
+    resources.apply("stt")
+
+    speech, tts, chunker = _NoSpeech(), None, TextChunker()
+    if use_tts:
+        tts = registry.get("piper_tts")
+        speech = SpeechPipeline(tts)
+        speech.start()
+        chunker = TextChunker(**(tts.config.get("chunking") or {}))
+
+    session = None
+    if use_llm:
+        model, tokenizer = registry.get("qwen")
+        session = ChatSession(model, tokenizer, assistant_model=registry.get("qwen_draft"))
+
+    records = []
+    for repeat in range(args.repeats):
+        for clip in clips:
+            duration = len(clip["audio"]) / 16000
+            print(f"\n=== {clip['name']} ({duration:.1f}s, run {repeat + 1}) ===")
+
+            tracer.start_turn()
+            device.play_input(clip["audio"], lead_in_s=0.5)
+            result = listen_and_transcribe()
+            tracer.mark("stt_done")
+            print(f"👤 ({result['language']}): {result['text']}")
+
+            if use_llm:
+                # A fresh conversation per clip keeps runs comparable
+                memory = ConversationMemory(tokenizer, SYSTEM_PROMPT, max_tokens=MAX_HISTORY_TOKENS)
+                session.prime(memory.messages)
+                respond(session, memory, chunker, speech, result["text"], result["language"],
+                        max_new_tokens=args.max_new_tokens)
+            elif use_tts:
+                speech.submit(result["text"], language=result["language"])
+                speech.wait()
+                tracer.mark("playback_end")
+
+            record = tracer.finish_turn(
+                clip=clip["name"], run=repeat, audio_s=duration,
+                expected_language=clip["language"], language=result["language"],
+                engine=result["engine"], text=result["text"],
+            )
+
+            if not args.no_offline_stt:
+                audio = clip["audio"] / max(1e-6, np.max(np.abs(clip["audio"])))
+                start = time.perf_counter()
+                stt.transcribe(audio_array=audio, sample_rate=16000)
+                record["metrics"]["stt_offline_rtf"] = (time.perf_counter() - start) / duration
+
+            records.append(record)
+
+    if use_tts:
+        speech.close()
+        tts.close()
+
+    labelled = [r for r in records if r["expected_language"]]
+    report = {
+        "meta": {
+            "time": time.time(),
+            "commit": git_commit(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "cpu_budget": {stage: resources.threads(stage) for stage in resources.plan},
+            "args": vars(args),
+        },
+        "load_s": load_s,
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": peak_rss_mb(),
+        "language_accuracy": (
+            sum(r["language"] == r["expected_language"] for r in labelled) / len(labelled)
+            if labelled else None
+        ),
+        "whisper_decoding": stt.whisper.decoding_report(),
+        "summary": summarize(records),
+        "clips": records,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
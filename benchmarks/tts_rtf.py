@@ -0,0 +1,106 @@
+"""
+Piper real-time factor (synthesis time / audio duration) per ONNX Runtime setting.
+
+    python benchmarks/tts_rtf.py --language en
+    python benchmarks/tts_rtf.py --language ml --threads 1 2 4 --opt-levels basic all
+    python benchmarks/tts_rtf.py --json tts_rtf.json
+
+Every combination of intra-op threads and graph optimization level gets
+a fresh session for the voice (other settings come from voice_pool in
+the TTS config), one warm-up sentence, then the same sentences. Lower
+RTF is better; below 1.0 is faster than real time.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from text_to_multi_speech.src.piper_tts import PiperTTS
+
+SENTENCES = {
+    "en": [
+        "Good morning, class.",
+        "Photosynthesis is how plants make food from sunlight, water and air.",
+        "To add two fractions, first make their denominators the same, "
+        "then add the numerators and keep the denominator.",
+    ],
+    "ml": [
+        "സുപ്രഭാതം, കുട്ടികളേ.",
+        "സസ്യങ്ങൾ സൂര്യപ്രകാശം ഉപയോഗിച്ച് ഭക്ഷണം ഉണ്ടാക്കുന്ന പ്രക്രിയയാണ് പ്രകാശസംശ്ലേഷണം.",
+        "രണ്ട് ഭിന്നസംഖ്യകൾ കൂട്ടാൻ ആദ്യം ഛേദങ്ങൾ ഒരുപോലെയാക്കുക.",
+    ],
+}
+
+
+def benchmark(tts, language, settings, repeats):
+    load_start = time.perf_counter()
+    voice = tts.create_voice(language, session_settings=settings)
+    load_time = time.perf_counter() - load_start
+
+    for _ in voice.synthesize("Warm up."):
+        pass
+
+    first_chunk, spent, audio = [], 0.0, 0.0
+    for _ in range(repeats):
+        for text in SENTENCES.get(language, SENTENCES["en"]):
+            start = time.perf_counter()
+            chunks = voice.synthesize(text)
+            first = next(chunks, None)
+            first_chunk.append(time.perf_counter() - start)
+
+            samples = len(first.audio_float_array) if first is not None else 0
+            samples += sum(len(chunk.audio_float_array) for chunk in chunks)
+            spent += time.perf_counter() - start
+            audio += samples / voice.config.sample_rate
+
+    return {
+        **settings,
+        "load_s": load_time,
+        "rtf": spent / audio if audio else 0.0,
+        "first_chunk_s": sum(first_chunk) / len(first_chunk),
+        "audio_s": audio,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--opt-levels", nargs="+", default=["basic", "all"],
+                        choices=["disable", "basic", "extended", "all"])
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--json", help="write full results to this file")
+    args = parser.parse_args()
+
+    tts = PiperTTS()
+    base = tts.session_settings(args.language)
+
+    results = []
+    for threads, level in itertools.product(args.threads, args.opt_levels):
+        settings = {**base, "intra_op_num_threads": threads, "graph_optimization_level": level}
+        print(f"=== {args.language}: {threads} threads, opt level {level} ===")
+        results.append(benchmark(tts, args.language, settings, args.repeats))
+
+    print("\n" + "-" * 60)
+    print(f"{'threads':>7} {'opt level':>10} {'load s':>8} {'RTF':>7} {'1st chunk s':>12}")
+    for r in results:
+        print(
+            f"{r['intra_op_num_threads']:>7} {r['graph_optimization_level']:>10} "
+            f"{r['load_s']:>8.2f} {r['rtf']:>7.3f} {r['first_chunk_s']:>12.3f}"
+        )
+    print("-" * 60)
+
+    tts.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Compare Whisper compute types side by side: speed and word error rate.
+
+    python benchmarks/whisper_compute.py --corpus corpus/
+    python benchmarks/whisper_compute.py --corpus corpus/ --compute-types float32 int8 --json whisper.json
+
+The corpus is the replay corpus (corpus/en/*.wav, ...); a clip is scored
+for WER when a reference transcript sits next to it (clip.wav ->
+clip.txt). Every compute type is loaded in turn from the same config
+(model size, artifacts, tiered decoding), then runs the same clips
+through transcribe_array(), peak-normalised as HybridSTT does; the
+language subdirectory is passed as the decoding language, and
+detect_language() is scored separately. A compute type that fails to
+load or run stops the benchmark.
+"""
+import argparse
+import gc
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from audio_io import read_wav
+from whisper_stt.src.audio_utils import to_mono_float32
+from whisper_stt.src.hybrid_stt import load_stt_config
+from whisper_stt.src.whisper_backends import resolve_compute_type
+from whisper_stt.src.whisper_stt import WhisperSTT
+
+
+def load_corpus(corpus_dir):
+    clips = []
+    for path in sorted(Path(corpus_dir).rglob("*.wav")):
+        audio, sample_rate = read_wav(path)
+        reference = path.with_suffix(".txt")
+        clips.append({
+            "name": str(path.relative_to(corpus_dir)),
+            "language": path.parent.name if path.parent != Path(corpus_dir) else None,
+            "audio": normalize(to_mono_float32(audio, sample_rate)),
+            "reference": reference.read_text(encoding="utf-8") if reference.exists() else None,
+        })
+    if not clips:
+        raise SystemExit(f"No .wav files under {corpus_dir}")
+    return clips
+
+
+def normalize(audio):
+    """Peak normalisation, as in the live / offline STT paths"""
+    return audio / max(1e-6, np.max(np.abs(audio), initial=0.0))
+
+
+# ----------------------------------------
+
+
+def normalize_words(text):
+    """Lower-case words with punctuation/symbols dropped (keeps Indic vowel signs)"""
+    text = "".join(
+        " " if unicodedata.category(c)[0] in "PS" else c
+        for c in unicodedata.normalize("NFC", text.lower())
+    )
+    return re.split(r"\s+", text.strip()) if text.strip() else []
+
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + insertions + deletions)"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            ))
+        previous = current
+    return previous[-1]
+
+
+# ----------------------------------------
+
+
+def benchmark(config_path, compute_type, clips, repeats):
+    load_start = time.perf_counter()
+    stt = WhisperSTT(config_path, compute_type=compute_type)
+    load_time = time.perf_counter() - load_start
+
+    runs = []
+    for _ in range(repeats):
+        for clip in clips:
+            duration = len(clip["audio"]) / 16000
+
+            start = time.perf_counter()
+            result = stt.transcribe_array(clip["audio"], language=clip["language"])
+            elapsed = time.perf_counter() - start
+
+            language, _ = stt.detect_language(stt.encode(clip["audio"]))
+
+            run = {
+                "clip": clip["name"],
+                "audio_s": duration,
+                "transcribe_s": elapsed,
+                "rtf": elapsed / duration,
+                "text": result["text"],
+                "expected_language": clip["language"],
+                "detected_language": language,
+            }
+            if clip["reference"] is not None:
+                reference = normalize_words(clip["reference"])
+                run["ref_words"] = len(reference)
+                run["word_errors"] = word_errors(reference, normalize_words(result["text"]))
+            runs.append(run)
+
+    decoding = stt.decoding_report()
+    del stt
+    gc.collect()
+
+    scored = [r for r in runs if "word_errors" in r]
+    ref_words = sum(r["ref_words"] for r in scored)
+    labelled = [r for r in runs if r["expected_language"]]
+
+    return {
+        "compute_type": compute_type,
+        "load_s": load_time,
+        "audio_s": sum(r["audio_s"] for r in runs),
+        "transcribe_s": sum(r["transcribe_s"] for r in runs),
+        "rtf": sum(r["transcribe_s"] for r in runs) / sum(r["audio_s"] for r in runs),
+        "wer": sum(r["word_errors"] for r in scored) / ref_words if ref_words else None,
+        "language_accuracy": (
+            sum(r["detected_language"] == r["expected_language"] for r in labelled) / len(labelled)
+            if labelled else None
+        ),
+        "whisper_decoding": decoding,
+        "runs": runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", required=True, help="directory of WAV (+ .txt reference) files")
+    parser.add_argument("--compute-types", nargs="+", default=["float32", "int8"])
+    parser.add_argument("--config", help="STT config (default: whisper_stt/config/config.yaml)")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--json", help="write full results to this file")
+    args = parser.parse_args()
+
+    for compute_type in args.compute_types:
+        resolve_compute_type(compute_type)  # fail on a typo before the first run
+
+    config, config_path = load_stt_config(args.config)
+    clips = load_corpus(args.corpus)
+    print(f"Whisper '{config['model']['size']}': {len(clips)} clips, "
+          f"{sum(c['reference'] is not None for c in clips)} with reference text")
+
+    results = []
+    for compute_type in args.compute_types:
+        print(f"\n=== {compute_type} ===")
+        results.append(benchmark(config_path, compute_type, clips, args.repeats))
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print("\n" + "-" * 72)
+    print(f"{'compute':<10} {'load s':>8} {'RTF':>8} {'speedup':>8} "
+          f"{'WER':>8} {'LID acc':>8} {'beam fb':>8}")
+    baseline = results[0]["transcribe_s"] if results else None
+    for r in results:
+        decoding = r["whisper_decoding"]
+        print(
+            f"{r['compute_type']:<10} {r['load_s']:>8.1f} {r['rtf']:>8.3f} "
+            f"{baseline / r['transcribe_s']:>7.2f}x "
+            f"{fmt(r['wer'], '.1%'):>8} {fmt(r['language_accuracy'], '.0%'):>8} "
+            f"{decoding['beam_fallbacks']:>3}/{decoding['greedy_decodes']:<4}"
+        )
+    print("-" * 72)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Chat-template tokens around every message:
+# <|im_start|>{role}\n ... <|im_end|>\n
+MESSAGE_OVERHEAD_TOKENS = 5
+
+
+class ConversationMemory:
+    """
+    Chat history with a token budget.
+
+    Every message is tokenized once when it is added and its count is
+    cached, so the running total never requires re-tokenizing the
+    history. When the total exceeds `max_tokens`, whole turns are dropped
+    from the oldest end (the system prompt and the newest message are
+    always kept) until the total is back under
+    `low_watermark * max_tokens`. Evicting in one larger step rather than
+    one turn at a time means the KV cache prefix only has to be rebuilt
+    occasionally.
+
+    The budget covers the prompt only; leave room for max_new_tokens.
+    """
+
+    def __init__(self, tokenizer, system_prompt, max_tokens=2048, low_watermark=0.75):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.low_watermark = low_watermark
+
+        self.messages = []
+        self.token_counts = []
+        self.total_tokens = 0
+        self.evicted_messages = 0
+
+        self.add("system", system_prompt)
+
+    def __len__(self):
+        return len(self.messages)
+
+    # --------------------------------------------------
+
+    def _count(self, content):
+        ids = self.tokenizer(content, add_special_tokens=False)["input_ids"]
+        return len(ids) + MESSAGE_OVERHEAD_TOKENS
+
+    def add(self, role, content):
+        """Append a message and enforce the token budget"""
+        count = self._count(content)
+
+        self.messages.append({"role": role, "content": content})
+        self.token_counts.append(count)
+        self.total_tokens += count
+
+        self._enforce_budget()
+
+    def _pop(self, index):
+        self.messages.pop(index)
+        self.total_tokens -= self.token_counts.pop(index)
+        self.evicted_messages += 1
+
+    def _enforce_budget(self):
+        if self.total_tokens <= self.max_tokens:
+            return
+
+        target = int(self.max_tokens * self.low_watermark)
+
+        # messages[0] is the system prompt, messages[-1] the newest turn
+        while self.total_tokens > target and len(self.messages) > 2:
+            self._pop(1)
+
+            # Drop the reply together with its question, even if it is
+            # the newest message (no orphan reply after the system prompt)
+            if len(self.messages) > 1 and self.messages[1]["role"] == "assistant":
+                self._pop(1)
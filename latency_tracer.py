@@ -0,0 +1,290 @@
+"""
+Per-stage latency tracing for voice turns.
+
+    from latency_tracer import tracer
+
+    tracer.start_turn()               # before listening
+    tracer.mark("vad_end")            # from any thread
+    tracer.add("lid_ms", 42.0)        # accumulates within the turn
+    tracer.update(session.last_timing, prefix="llm_")
+    tracer.add_sentence(chars=..., synth_s=..., audio_s=...)
+    tracer.finish_turn(language="en")   # always, e.g. in a finally block
+
+Marks are timestamps (time.perf_counter) and become intervals in
+INTERVALS; everything is relative to the VAD endpoint, the moment the
+student stops talking. Each finished turn is appended to a JSONL file
+and to rolling windows that give p50/p95/p99 per metric, optionally
+served in the Prometheus text format. All calls are no-ops when no turn
+is active, so shared components can call them unconditionally.
+"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_CONFIG_PATH = BASE_DIR / "config" / "tracing.yaml"
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# metric -> (from mark, to mark)
+INTERVALS = {
+    "speech_ms": ("vad_speech_start", "vad_end"),
+    "endpoint_ms": ("vad_last_speech", "vad_end"),     # silence hangover
+    "stt_ms": ("vad_end", "stt_done"),                 # endpoint -> transcript
+    "llm_ttft_ms": ("llm_start", "llm_first_token"),
+    "first_audio_ms": ("vad_end", "first_audio"),      # what the student waits for
+    "turn_ms": ("vad_end", "playback_end"),
+}
+
+# metric -> (numerator, denominator) metrics
+RATIOS = {
+    "vad_rtf": ("vad_compute_ms", "vad_audio_ms"),
+}
+
+# Printed after every turn
+TURN_SUMMARY = (
+    ("stt", "stt_ms"), ("lid", "lid_ms"), ("first token", "llm_first_token_ms"),
+    ("ttft", "llm_ttft_ms"), ("first audio", "first_audio_ms"),
+)
+
+
+class LatencyTracer:
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get("enabled", False)
+        self.print_turns = config.get("print_turns", True)
+        self.summary_every = config.get("summary_every", 10)
+        self.window = config.get("window", 200)
+
+        path = config.get("jsonl")
+        self.jsonl_path = BASE_DIR / path if path else None
+
+        self.current = None
+        self.turns = 0
+        self._windows = {}
+        self._totals = {}   # metric -> [count, sum] since start
+        self._lock = threading.Lock()
+        self._server = None
+
+        prometheus = config.get("prometheus") or {}
+        if self.enabled and prometheus.get("enabled", False):
+            self.serve_prometheus(prometheus.get("port", 9108), prometheus.get("host", "127.0.0.1"))
+
+    @classmethod
+    def from_config(cls, config_path=None):
+        path = Path(config_path or DEFAULT_CONFIG_PATH)
+        if not path.exists():
+            return cls()
+        with open(path, "r") as f:
+            return cls(yaml.safe_load(f))
+
+    # --------------------------------------------------
+    # Recording (safe from any thread)
+    # --------------------------------------------------
+
+    def start_turn(self):
+        """Begin a new turn; marks from any thread now go to it"""
+        if not self.enabled:
+            return
+        self.current = {"marks": {}, "metrics": {}, "sentences": []}
+
+    def mark(self, name, overwrite=False):
+        """Timestamp an event (by default only its first occurrence)"""
+        turn = self.current
+        if turn is None:
+            return
+        if overwrite or name not in turn["marks"]:
+            turn["marks"][name] = time.perf_counter()
+
+    def add(self, name, value):
+        """Add to a per-turn metric (e.g. two LID passes)"""
+        turn = self.current
+        if turn is None or value is None:
+            return
+        with self._lock:
+            turn["metrics"][name] = turn["metrics"].get(name, 0.0) + value
+
+    def set(self, name, value):
+        turn = self.current
+        if turn is None or value is None:
+            return
+        turn["metrics"][name] = value
+
+    def update(self, values, prefix=""):
+        """Set several metrics at once ("*_s" seconds are stored as "*_ms")"""
+        for name, value in (values or {}).items():
+            if name.endswith("_s") and not name.endswith("_per_s") and value is not None:
+                name, value = name[:-2] + "_ms", value * 1000
+            self.set(prefix + name, value)
+
+    def add_sentence(self, chars, synth_s, audio_s, language=None):
+        """One synthesized TTS sentence"""
+        turn = self.current
+        if turn is None:
+            return
+        with self._lock:
+            turn["sentences"].append({
+                "chars": chars,
+                "language": language,
+                "synth_ms": synth_s * 1000,
+                "audio_ms": audio_s * 1000,
+                "rtf": synth_s / audio_s if audio_s else None,
+            })
+
+    def discard_turn(self):
+        """Drop the current turn without recording it (e.g. on shutdown)"""
+        self.current = None
+
+    def finish_turn(self, **info):
+        """Close the current turn: JSONL record + rolling windows; returns the record"""
+        turn, self.current = self.current, None
+        if turn is None:
+            return None
+
+        marks = turn["marks"]
+        metrics = dict(turn["metrics"])
+        for name, (start, end) in INTERVALS.items():
+            if start in marks and end in marks:
+                metrics[name] = (marks[end] - marks[start]) * 1000
+        for name, (num, den) in RATIOS.items():
+            if metrics.get(den):
+                metrics[name] = metrics[num] / metrics[den]
+
+        sentences = turn["sentences"]
+        samples = {name: [value] for name, value in metrics.items()}
+        if sentences:
+            samples["tts_synth_ms"] = [s["synth_ms"] for s in sentences]
+            samples["tts_rtf"] = [s["rtf"] for s in sentences if s["rtf"] is not None]
+            metrics["tts_synth_ms"] = sum(samples["tts_synth_ms"])
+            metrics["tts_rtf"] = (
+                metrics["tts_synth_ms"] / sum(s["audio_ms"] for s in sentences)
+                if any(s["audio_ms"] for s in sentences) else None
+            )
+
+        zero = marks.get("vad_end", min(marks.values(), default=0.0))
+        self.turns += 1
+        record = {
+            "turn": self.turns,
+            "time": time.time(),
+            **info,
+            "metrics": {k: round(v, 3) for k, v in metrics.items() if v is not None},
+            "marks_ms": {k: round((t - zero) * 1000, 1) for k, t in sorted(marks.items(), key=lambda m: m[1])},
+            "sentences": sentences,
+        }
+
+        with self._lock:
+            for name, values in samples.items():
+                window = self._windows.setdefault(name, deque(maxlen=self.window))
+                totals = self._totals.setdefault(name, [0, 0.0])
+                for value in values:
+                    window.append(value)
+                    totals[0] += 1
+                    totals[1] += value
+
+        self._write(record)
+        if self.print_turns:
+            self._print_turn(record["metrics"])
+        if self.summary_every and self.turns % self.summary_every == 0:
+            self.print_summary()
+        return record
+
+    # --------------------------------------------------
+    # Reporting
+    # --------------------------------------------------
+
+    def summary(self):
+        """metric -> {"count", "p50", "p95", "p99"} over the rolling window"""
+        with self._lock:
+            windows = {name: list(values) for name, values in self._windows.items()}
+
+        summary = {}
+        for name, values in sorted(windows.items()):
+            if not values:
+                continue
+            points = np.percentile(values, [q * 100 for q in QUANTILES])
+            summary[name] = {"count": len(values)}
+            summary[name].update({f"p{int(q * 100)}": float(p) for q, p in zip(QUANTILES, points)})
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print("\n" + "-" * 60)
+        print(f"Latency over the last {self.window} samples")
+        print(f"{'metric':<18} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, s in summary.items():
+            print(f"{name:<18} {s['count']:>5} {s['p50']:>9.1f} {s['p95']:>9.1f} {s['p99']:>9.1f}")
+        print("-" * 60)
+
+    def prometheus_text(self):
+        """Rolling quantiles (+ lifetime count/sum) in Prometheus text format"""
+        summary = self.summary()
+        with self._lock:
+            totals = {name: list(t) for name, t in self._totals.items()}
+
+        lines = []
+        for name, s in summary.items():
+            metric = f"teacherbot_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {s[f"p{int(q * 100)}"]:.6g}')
+            count, total = totals.get(name, (0, 0.0))
+            lines.append(f"{metric}_sum {total:.6g}")
+            lines.append(f"{metric}_count {count}")
+        lines.append("# TYPE teacherbot_turns_total counter")
+        lines.append(f"teacherbot_turns_total {self.turns}")
+        return "\n".join(lines) + "\n"
+
+    def serve_prometheus(self, port=9108, host="127.0.0.1"):
+        """Serve prometheus_text() at http://host:port/metrics (daemon thread)"""
+        if self._server is not None:
+            return
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = tracer.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Latency metrics at http://{host}:{port}/metrics")
+
+    # --------------------------------------------------
+
+    def _write(self, record):
+        if self.jsonl_path is None:
+            return
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _print_turn(self, metrics):
+        parts = [f"{label} {metrics[name]:.0f}ms" for label, name in TURN_SUMMARY if name in metrics]
+        if "llm_tokens_per_s" in metrics:
+            parts.append(f"{metrics['llm_tokens_per_s']:.1f} tok/s")
+        if metrics.get("tts_rtf") is not None:
+            parts.append(f"TTS RTF {metrics['tts_rtf']:.2f}")
+        if "turn_ms" in metrics:
+            parts.append(f"turn {metrics['turn_ms'] / 1000:.1f}s")
+        print("⏱️ " + " | ".join(parts))
+
+
+tracer = LatencyTracer.from_config()
@@ -0,0 +1,129 @@
+import os
+import yaml
+import torch
+from pathlib import Path
+from transformers import AutoModelForCausalLM, BitsAndBytesConfig
+
+from resource_manager import resources
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / "config" / "llm.yaml"
+
+
+def load_llm_config(config_path=None):
+    with open(config_path or DEFAULT_CONFIG_PATH, "r") as f:
+        return yaml.safe_load(f)
+
+
+# ----------------------------------------
+
+
+def _load_bnb_nf4(model_dir, config):
+    """bitsandbytes 4-bit NF4 (CUDA)"""
+    bnb_config = BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_quant_type="nf4",
+        bnb_4bit_compute_dtype=torch.float16,
+        bnb_4bit_use_double_quant=True,
+    )
+
+    return AutoModelForCausalLM.from_pretrained(
+        model_dir,
+        quantization_config=bnb_config,
+        device_map="auto",
+        trust_remote_code=True,
+    )
+
+
+def _load_cpu_fp32(model_dir, config):
+    """Plain float32 on CPU"""
+    model = AutoModelForCausalLM.from_pretrained(
+        model_dir,
+        torch_dtype=torch.float32,
+        low_cpu_mem_usage=True,
+        trust_remote_code=True,
+    )
+    return model.eval()
+
+
+def _load_cpu_int8(model_dir, config):
+    """float32 weights with int8 dynamic quantization of Linear layers"""
+    model = _load_cpu_fp32(model_dir, config)
+
+    # In place: the fp32 Linear weights are freed as each layer is
+    # quantized instead of keeping a full fp32 copy until the end
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def _load_onnx(model_dir, config):
+    """ONNX Runtime (exported once with optimum, then reused)"""
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM
+    except ImportError as e:
+        raise ImportError(
+            "The 'onnx' backend needs: pip install optimum[onnxruntime]"
+        ) from e
+
+    export_dir = config.get("onnx", {}).get("export_dir", "./qwen_model_onnx")
+
+    if os.path.exists(export_dir) and os.listdir(export_dir):
+        return ORTModelForCausalLM.from_pretrained(export_dir, use_cache=True)
+
+    print(f"Exporting model to ONNX (one-time): {export_dir}")
+    model = ORTModelForCausalLM.from_pretrained(
+        model_dir, export=True, use_cache=True
+    )
+    model.save_pretrained(export_dir)
+    return model
+
+
+BACKENDS = {
+    "bnb-nf4": _load_bnb_nf4,
+    "cpu-fp32": _load_cpu_fp32,
+    "cpu-int8": _load_cpu_int8,
+    "onnx": _load_onnx,
+}
+
+
+def resolve_backend(name):
+    if name in (None, "auto"):
+        return "bnb-nf4" if torch.cuda.is_available() else "cpu-int8"
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown LLM backend '{name}' (choose from: auto, {', '.join(BACKENDS)})"
+        )
+    return name
+
+
+def load_backend_model(model_dir, backend=None, config=None):
+    """Load the causal LM with the chosen backend. Returns (model, backend)."""
+    config = config or {}
+    backend = resolve_backend(backend or config.get("backend"))
+
+    # Process-wide setting: with a CPU budget, torch_threads wins
+    num_threads = config.get("cpu", {}).get("num_threads")
+    if backend != "bnb-nf4" and num_threads and not resources.enabled:
+        torch.set_num_threads(num_threads)
+
+    return BACKENDS[backend](model_dir, config), backend
+
+
+def load_draft_model(model_dir, backend=None, config=None):
+    """
+    Load the speculative-decoding draft model with the same backend as
+    the target, or return None when speculative decoding is disabled.
+    """
+    config = config or {}
+    spec = config.get("speculative") or {}
+    if not spec.get("enabled"):
+        return None
+
+    backend = resolve_backend(backend or config.get("backend"))
+    if backend == "onnx":
+        print("Speculative decoding is not supported with the onnx backend; disabled.")
+        return None
+
+    draft = BACKENDS[backend](model_dir, config)
+    draft.generation_config.num_assistant_tokens = spec.get("num_assistant_tokens", 5)
+    return draft
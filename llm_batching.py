@@ -0,0 +1,348 @@
+import queue
+import threading
+
+import torch
+import torch.nn.functional as F
+from transformers import DynamicCache, TextIteratorStreamer
+
+from resource_manager import resources
+
+
+def _cache_layers(cache):
+    """Per-layer (keys, values) tensors, across transformers versions"""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def _build_cache(layers):
+    cache = DynamicCache()
+    for i, (keys, values) in enumerate(layers):
+        cache.update(keys, values, i)
+    return cache
+
+
+def _pad_left(layers, n):
+    """Left-pad the sequence axis of (B, H, L, D) cache tensors by n"""
+    if n == 0:
+        return layers
+    return [(F.pad(k, (0, 0, n, 0)), F.pad(v, (0, 0, n, 0))) for k, v in layers]
+
+
+def _common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class SessionCache:
+    """
+    KV state one conversation keeps between turns: the token ids seen
+    so far and their per-layer keys/values (batch 1, no padding).
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.layers = None
+
+
+class _ReplyStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that re-raises a generation error in the reader"""
+
+    error = None
+
+    def fail(self, error):
+        self.error = error
+        self.end()
+
+    def __next__(self):
+        try:
+            return super().__next__()
+        except StopIteration:
+            if self.error is not None:
+                raise self.error
+            raise
+
+
+class _Sequence:
+    def __init__(self, prompt_ids, max_new_tokens, temperature, streamer, session_cache):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.streamer = streamer
+        self.session_cache = session_cache
+
+        self.generated = []
+        self.length = 0          # tokens whose K/V are in the cache
+        self.next_token = None   # sampled, not yet fed to the model
+        self.layers = None       # own cache until it joins the batch
+
+
+class ContinuousBatcher:
+    """
+    Iteration-level (continuous) batching for a causal LM.
+
+    All active requests share one batched decode step per token. New
+    requests are prefilled on their own and join the running batch at
+    the next step; finished ones leave immediately, so short answers
+    never wait for long ones. The batch KV cache is left-padded to a
+    common length, with explicit position ids and an attention mask per
+    row.
+
+    Each request can carry a SessionCache so a conversation only
+    prefills the tokens added since its previous turn.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size=4):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+
+        gen_config = model.generation_config
+        eos = gen_config.eos_token_id
+        eos = eos if isinstance(eos, (list, tuple)) else [eos]
+        self.eos_token_ids = {t for t in eos + [tokenizer.eos_token_id] if t is not None}
+        self.top_k = gen_config.top_k or 0
+        self.top_p = gen_config.top_p or 1.0
+
+        self._pending = queue.Queue()
+        self._running = threading.Event()
+        self._thread = None
+
+        self.active = []
+        self.batch_layers = None
+        self.attention_mask = None
+
+        # counters for reporting
+        self.steps = 0
+        self.step_rows = 0
+
+    def start(self):
+        if self._thread is None:
+            self._running.set()
+            self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._running.clear()
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def mean_batch_size(self):
+        return self.step_rows / self.steps if self.steps else 0.0
+
+    def submit(self, input_ids, max_new_tokens=256, temperature=0.7, session_cache=None):
+        """
+        Queue a prompt (list of token ids). Returns a TextIteratorStreamer
+        yielding the reply text as it is generated; iterating it raises
+        if generation failed.
+        """
+        streamer = _ReplyStreamer(self.tokenizer, skip_special_tokens=True)
+        self._pending.put(_Sequence(
+            list(input_ids), max_new_tokens, temperature, streamer, session_cache
+        ))
+        return streamer
+
+    # --------------------------------------------------
+
+    def _run(self):
+        resources.apply("llm")
+        while self._running.is_set():
+            try:
+                with torch.no_grad():
+                    self._admit()
+                    if self.active:
+                        self._step()
+            except Exception as e:
+                # A batched step failed: every active row was in it
+                print(f"LLM batcher error: {e}")
+                self._abort_all(e)
+
+    def _admit(self):
+        while len(self.active) < self.max_batch_size:
+            try:
+                # Block briefly only when there is nothing else to do
+                seq = self._pending.get(timeout=0.05 if not self.active else 0)
+            except queue.Empty:
+                return
+
+            try:
+                finished = self._prefill(seq)
+            except Exception as e:
+                # Only this request fails; the running batch carries on
+                print(f"LLM prefill error: {e}")
+                self._fail(seq, e)
+                continue
+
+            if finished:
+                self._finish(seq, seq.layers)
+            else:
+                self._join(seq)
+
+    def _prefill(self, seq):
+        """Run the prompt through the model alone; returns True if already finished"""
+        ids = seq.prompt_ids
+        cache, reused = DynamicCache(), 0
+
+        session = seq.session_cache
+        if session is not None and session.layers is not None:
+            reused = min(_common_prefix_length(session.ids, ids), len(ids) - 1)
+            if reused > 0:
+                cache = _build_cache(
+                    [(k[:, :, :reused], v[:, :, :reused]) for k, v in session.layers]
+                )
+
+        device = self.model.device
+        out = self.model(
+            input_ids=torch.tensor([ids[reused:]], device=device),
+            position_ids=torch.arange(reused, len(ids), device=device).unsqueeze(0),
+            past_key_values=cache,
+            use_cache=True,
+        )
+
+        seq.layers = _cache_layers(out.past_key_values)
+        seq.length = len(ids)
+        token = self._sample(out.logits[:, -1], [seq.temperature])[0]
+        return self._emit(seq, token)
+
+    def _join(self, seq):
+        """Add a prefilled sequence to the running batch"""
+        if not self.active:
+            self.batch_layers = seq.layers
+            self.attention_mask = torch.ones(1, seq.length, dtype=torch.long)
+        else:
+            current = self.attention_mask.shape[1]
+            if seq.length > current:
+                self.batch_layers = _pad_left(self.batch_layers, seq.length - current)
+                self.attention_mask = F.pad(self.attention_mask, (seq.length - current, 0))
+                current = seq.length
+
+            pad = current - seq.length
+            new_layers = _pad_left(seq.layers, pad)
+            self.batch_layers = [
+                (torch.cat([k, nk]), torch.cat([v, nv]))
+                for (k, v), (nk, nv) in zip(self.batch_layers, new_layers)
+            ]
+            row = F.pad(torch.ones(1, seq.length, dtype=torch.long), (pad, 0))
+            self.attention_mask = torch.cat([self.attention_mask, row])
+
+        seq.layers = None
+        self.active.append(seq)
+
+    def _step(self):
+        """One decode step for every active sequence"""
+        device = self.model.device
+        batch = len(self.active)
+
+        mask = F.pad(self.attention_mask, (0, 1), value=1)
+        out = self.model(
+            input_ids=torch.tensor([[s.next_token] for s in self.active], device=device),
+            position_ids=torch.tensor([[s.length] for s in self.active], device=device),
+            attention_mask=mask.to(device),
+            past_key_values=_build_cache(self.batch_layers),
+            use_cache=True,
+        )
+
+        self.batch_layers = _cache_layers(out.past_key_values)
+        self.attention_mask = mask
+        self.steps += 1
+        self.step_rows += batch
+
+        tokens = self._sample(out.logits[:, -1], [s.temperature for s in self.active])
+
+        finished = []
+        for row, (seq, token) in enumerate(zip(self.active, tokens)):
+            seq.length += 1
+            if self._emit(seq, token):
+                finished.append(row)
+
+        if finished:
+            self._retire(finished)
+
+    def _retire(self, rows):
+        total = self.attention_mask.shape[1]
+        for row in rows:
+            seq = self.active[row]
+            start = total - seq.length
+            self._finish(seq, [
+                (k[row:row + 1, :, start:], v[row:row + 1, :, start:])
+                for k, v in self.batch_layers
+            ])
+
+        keep = [i for i in range(len(self.active)) if i not in rows]
+        self.active = [self.active[i] for i in keep]
+        if not self.active:
+            self.batch_layers = None
+            self.attention_mask = None
+            return
+
+        index = torch.tensor(keep, device=self.batch_layers[0][0].device)
+        # Drop left padding no remaining row needs
+        trim = total - max(s.length for s in self.active)
+        self.batch_layers = [
+            (k.index_select(0, index)[:, :, trim:], v.index_select(0, index)[:, :, trim:])
+            for k, v in self.batch_layers
+        ]
+        self.attention_mask = self.attention_mask[keep][:, trim:]
+
+    # --------------------------------------------------
+
+    def _emit(self, seq, token):
+        """Record a sampled token; returns True when the sequence is done"""
+        seq.generated.append(token)
+        seq.next_token = token
+
+        done = (token in self.eos_token_ids
+                or len(seq.generated) >= seq.max_new_tokens)
+
+        if token not in self.eos_token_ids:
+            seq.streamer.put(torch.tensor([token]))
+        return done
+
+    def _finish(self, seq, layers):
+        seq.streamer.end()
+
+        session = seq.session_cache
+        if session is not None:
+            # The last sampled token was never fed to the model
+            session.ids = seq.prompt_ids + seq.generated[:-1]
+            session.layers = layers
+
+    def _fail(self, seq, error):
+        seq.streamer.fail(error)
+        if seq.session_cache is not None:
+            seq.session_cache.layers = None
+
+    def _abort_all(self, error):
+        for seq in self.active:
+            self._fail(seq, error)
+        self.active = []
+        self.batch_layers = None
+        self.attention_mask = None
+
+    def _sample(self, logits, temperatures):
+        tokens = []
+        for row, temperature in zip(logits.float(), temperatures):
+            if not temperature or temperature <= 0:
+                tokens.append(int(row.argmax()))
+                continue
+
+            row = row / temperature
+            if self.top_k:
+                kth = torch.topk(row, min(self.top_k, row.shape[-1])).values[-1]
+                row = row.masked_fill(row < kth, float("-inf"))
+            if self.top_p < 1.0:
+                sorted_logits, order = torch.sort(row, descending=True)
+                cumulative = sorted_logits.softmax(-1).cumsum(-1)
+                remove = cumulative - sorted_logits.softmax(-1) > self.top_p
+                row = row.masked_fill(
+                    torch.zeros_like(remove).scatter(0, order, remove), float("-inf")
+                )
+
+            tokens.append(int(torch.multinomial(row.softmax(-1), 1)))
+        return tokens
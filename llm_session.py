@@ -0,0 +1,348 @@
+import time
+import torch
+from threading import Event, Lock, Thread
+from transformers import (
+    DynamicCache,
+    PreTrainedModel,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
+)
+
+from resource_manager import resources
+
+
+def build_prompt(tokenizer, messages, add_generation_prompt=True):
+    """Render chat messages with the model's chat template"""
+    try:
+        return tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=add_generation_prompt,
+            enable_thinking=False,
+        )
+    except TypeError:
+        return tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=add_generation_prompt,
+        )
+
+
+def _common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class DraftStats:
+    """
+    Estimates the draft acceptance rate of assisted (speculative)
+    generation by counting forward passes.
+
+    Each target pass verifies one run of draft tokens and always yields
+    one token of its own, so over a turn:
+        accepted = new_tokens - target_passes
+        acceptance_rate = accepted / draft_tokens
+    """
+
+    def __init__(self, model, assistant_model):
+        self._handles = [
+            model.register_forward_hook(self._on_target),
+            assistant_model.register_forward_hook(self._on_draft),
+        ]
+        self.reset()
+
+    def reset(self):
+        self.target_passes = 0
+        self.draft_tokens = 0
+
+    def _on_target(self, module, args, output):
+        self.target_passes += 1
+
+    def _on_draft(self, module, args, output):
+        self.draft_tokens += 1
+
+    def summary(self, new_tokens):
+        accepted = max(0, new_tokens - self.target_passes)
+        return {
+            "new_tokens": new_tokens,
+            "target_passes": self.target_passes,
+            "draft_tokens": self.draft_tokens,
+            "accepted_tokens": accepted,
+            "acceptance_rate": accepted / self.draft_tokens if self.draft_tokens else 0.0,
+        }
+
+    def close(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+
+class TimedStreamer(TextIteratorStreamer):
+    """TextIteratorStreamer that also records when each new token arrived"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token_times = []
+
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            # Assisted generation may hand over several tokens at once
+            self.token_times.extend([time.perf_counter()] * int(value.numel()))
+        super().put(value)
+
+
+class CancelCriteria(StoppingCriteria):
+    """Stops generate() after the current step once `event` is set"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full(
+            (input_ids.shape[0],), self.event.is_set(),
+            dtype=torch.bool, device=input_ids.device
+        )
+
+
+class ChatSession:
+    """
+    Multi-turn Qwen chat that keeps its KV cache between turns.
+
+    The cache holds the keys/values for every token already seen (system
+    prompt, earlier turns and the model's own replies). Each new turn only
+    prefills the tokens that were not seen before; if the history changed
+    (e.g. old turns were dropped) the cache is cropped back to the longest
+    shared prefix and the rest is recomputed.
+
+    With an `assistant_model` (a small draft model sharing the tokenizer)
+    every turn uses assisted generation; `last_stats` then holds the
+    draft acceptance figures of the most recent turn.
+
+    `last_timing` holds the time to the first token (prefill plus the
+    first decode step or assisted round) and the decode rate of the most
+    recent streamed turn. cancel() stops the running turn early (barge-in); the
+    cache keeps the tokens generated so far and is cropped next turn if
+    the saved reply differs. A turn started with the `epoch` read when
+    the reply began also honours a cancel() that came before it started.
+    """
+
+    def __init__(self, model, tokenizer, assistant_model=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.assistant_model = assistant_model
+
+        # Only plain transformers models accept an external DynamicCache
+        self.use_cache = isinstance(model, PreTrainedModel)
+
+        if assistant_model is not None and not self.use_cache:
+            raise ValueError("Speculative decoding needs a transformers (torch) model")
+
+        self.draft_stats = (
+            DraftStats(model, assistant_model) if assistant_model is not None else None
+        )
+        self.last_stats = None
+        self.last_timing = None
+
+        self._thread = None
+        self._cancel = Event()
+        self._cancel_lock = Lock()
+        self._epoch = 0          # bumped by cancel()
+        self.reset()
+
+    def reset(self):
+        """Forget all cached state"""
+        self.cache = DynamicCache() if self.use_cache else None
+        self.cached_ids = []     # tokens whose K/V are in self.cache
+        self._prompt_text = ""   # last rendered prompt ...
+        self._prompt_ids = []    # ... and its token ids
+
+    # --------------------------------------------------
+
+    def _tokenize(self, text):
+        """
+        Tokenize a rendered prompt. When the previous prompt is a prefix
+        (the usual case: history only grows), only the new suffix is
+        tokenized.
+        """
+        if self._prompt_text and text.startswith(self._prompt_text):
+            suffix = text[len(self._prompt_text):]
+            ids = self._prompt_ids + self.tokenizer(
+                suffix, add_special_tokens=False
+            )["input_ids"]
+        else:
+            ids = self.tokenizer(text)["input_ids"]
+
+        self._prompt_text = text
+        self._prompt_ids = ids
+        return ids
+
+    def _reuse_cache(self, ids, keep_last=True):
+        """Crop the cache to the part of `ids` it already covers"""
+        n = _common_prefix_length(self.cached_ids, ids)
+        if keep_last:
+            # generate() needs at least one uncached token to run
+            n = min(n, len(ids) - 1)
+
+        cached = self.cache.get_seq_length()
+        if n < cached:
+            # negative = number of tokens to drop (works across versions)
+            self.cache.crop(n - cached)
+        self.cached_ids = self.cached_ids[:n]
+        return n
+
+    @property
+    def epoch(self):
+        """Current cancel generation; read it when a reply starts"""
+        return self._epoch
+
+    def cancel(self):
+        """Stop the running generation after its current step (any thread)"""
+        with self._cancel_lock:
+            self._epoch += 1
+            self._cancel.set()
+
+    def wait(self):
+        """Block until the current streaming turn has fully finished"""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # --------------------------------------------------
+
+    def prime(self, messages):
+        """
+        Prefill a fixed prefix (normally just the system prompt) once, so
+        the first real turn starts from a warm cache.
+        """
+        if not self.use_cache:
+            return
+
+        self.wait()
+        text = build_prompt(self.tokenizer, messages, add_generation_prompt=False)
+        ids = self.tokenizer(text)["input_ids"]
+
+        n = self._reuse_cache(ids, keep_last=False)
+        if n == len(ids):
+            return
+
+        new_ids = torch.tensor([ids[n:]], device=self.model.device)
+        with torch.no_grad():
+            self.model(
+                input_ids=new_ids,
+                past_key_values=self.cache,
+                use_cache=True,
+            )
+        self.cached_ids = list(ids)
+
+    def _prepare(self, messages, epoch=None):
+        self.wait()
+        with self._cancel_lock:
+            # Keep a cancel() that arrived after `epoch` was read
+            if epoch is None or epoch == self._epoch:
+                self._cancel.clear()
+        ids = self._tokenize(build_prompt(self.tokenizer, messages))
+
+        input_ids = torch.tensor([ids], device=self.model.device)
+        inputs = {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+        }
+
+        self._prefill_tokens = len(ids)
+        if self.use_cache:
+            self._prefill_tokens -= self._reuse_cache(ids)
+            inputs["past_key_values"] = self.cache
+
+        return inputs
+
+    def _generate(self, inputs, generation_kwargs):
+        resources.apply("llm")
+
+        if self.assistant_model is not None:
+            generation_kwargs = dict(generation_kwargs, assistant_model=self.assistant_model)
+            self.draft_stats.reset()
+
+        criteria = StoppingCriteriaList(generation_kwargs.get("stopping_criteria") or [])
+        criteria.append(CancelCriteria(self._cancel))
+        generation_kwargs = dict(generation_kwargs, stopping_criteria=criteria)
+
+        start = time.perf_counter()
+        try:
+            with torch.no_grad():
+                output = self.model.generate(**inputs, **generation_kwargs)
+        except Exception:
+            # The cache may be half-updated; start clean next turn
+            self.reset()
+            streamer = generation_kwargs.get("streamer")
+            if streamer is not None:
+                streamer.end()
+            raise
+
+        if self.use_cache:
+            # The last sampled token is never fed back, so the cache is
+            # one token shorter than the output.
+            self.cached_ids = output[0][:self.cache.get_seq_length()].tolist()
+
+        if self.draft_stats is not None:
+            new_tokens = output.shape[-1] - inputs["input_ids"].shape[-1]
+            self.last_stats = self.draft_stats.summary(new_tokens)
+
+        streamer = generation_kwargs.get("streamer")
+        if isinstance(streamer, TimedStreamer):
+            self.last_timing = self._timing(start, streamer.token_times)
+
+        return output
+
+    def _timing(self, start, token_times):
+        """Time to the first new token (prefill + first step); decode rate over the rest"""
+        timing = {
+            "prefill_tokens": self._prefill_tokens,
+            "new_tokens": len(token_times),
+            "generate_s": time.perf_counter() - start,
+            "first_token_s": None,
+            "tokens_per_s": None,
+        }
+        if token_times:
+            timing["first_token_s"] = token_times[0] - start
+            decode_s = token_times[-1] - token_times[0]
+            if decode_s > 0:
+                timing["tokens_per_s"] = (len(token_times) - 1) / decode_s
+        return timing
+
+    # --------------------------------------------------
+
+    def generate(self, messages, epoch=None, **generation_kwargs):
+        """Blocking generation; returns the reply text"""
+        inputs = self._prepare(messages, epoch)
+        output = self._generate(inputs, generation_kwargs)
+
+        return self.tokenizer.decode(
+            output[0][inputs["input_ids"].shape[-1]:],
+            skip_special_tokens=True,
+        ).strip()
+
+    def stream(self, messages, epoch=None, **generation_kwargs):
+        """
+        Start generation in a background thread and return a
+        TextIteratorStreamer that yields the reply as it is produced.
+        `epoch`: session.epoch as read when the reply started (optional).
+        """
+        inputs = self._prepare(messages, epoch)
+
+        streamer = TimedStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True
+        )
+
+        self._thread = Thread(
+            target=self._generate,
+            args=(inputs, dict(generation_kwargs, streamer=streamer)),
+        )
+        self._thread.start()
+
+        return streamer
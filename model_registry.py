@@ -0,0 +1,232 @@
+"""
+Shared, lazy, once-only model construction.
+
+Every entry point asks the registry for models by name instead of
+building them itself, so Whisper / IndicSTT / Silero / Qwen / Piper are
+loaded at most once per process, no matter how many modules need them.
+
+    from model_registry import registry
+
+    registry.preload(["hybrid_stt", "silero_vad", "qwen", "piper_tts"])
+    registry.report()
+    stt = registry.get("hybrid_stt")
+
+preload() builds independent models concurrently on worker threads
+(most of the time goes to file I/O and weight conversion, which release
+the GIL); report() prints per-model load time and memory.
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+
+def _rss_mb():
+    """Resident set size of this process in MB (0 if unknown)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS (peak, not current)
+        scale = 2**20 if sys.platform == "darwin" else 2**10
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    except ImportError:
+        return 0.0
+
+
+def _weights_mb(obj):
+    """Size of torch parameters/buffers held by obj (one level deep)"""
+    try:
+        import torch
+    except ImportError:
+        return None
+
+    candidates = list(obj) if isinstance(obj, tuple) else [obj]
+    candidates += [getattr(obj, "model", None)]
+
+    seen, total = set(), 0
+    for candidate in candidates:
+        if not isinstance(candidate, torch.nn.Module) or id(candidate) in seen:
+            continue
+        seen.add(id(candidate))
+        for tensor in list(candidate.parameters()) + list(candidate.buffers()):
+            total += tensor.numel() * tensor.element_size()
+
+    return total / 2**20 if seen else None
+
+
+class _Entry:
+    def __init__(self, name, factory, deps):
+        self.name = name
+        self.factory = factory
+        self.deps = tuple(deps)
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.value = None
+        self.stats = None
+
+
+class ModelRegistry:
+    """Named model factories, each built lazily and exactly once"""
+
+    def __init__(self):
+        self._entries = {}
+        self._order = []          # names in the order they finished loading
+        self._order_lock = threading.Lock()
+        self._preload_wall = None
+
+    def register(self, name, factory, deps=()):
+        """
+        factory(registry) -> model. deps are names the factory gets from
+        the registry; they are loaded first (and counted separately).
+        """
+        self._entries[name] = _Entry(name, factory, deps)
+
+    def set(self, name, value):
+        """Install an already-built object (e.g. from tests or a server)"""
+        entry = self._entries.setdefault(name, _Entry(name, None, ()))
+        with entry.lock:
+            entry.value, entry.loaded = value, True
+
+    def is_loaded(self, name):
+        return name in self._entries and self._entries[name].loaded
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown model '{name}'")
+        if entry.loaded:
+            return entry.value
+
+        for dep in entry.deps:
+            self.get(dep)
+
+        with entry.lock:
+            if not entry.loaded:
+                self._load(entry)
+        return entry.value
+
+    def preload(self, names=None, max_workers=None):
+        """Build the given models (default: all) concurrently"""
+        names = [n for n in (names or list(self._entries)) if not self.is_loaded(n)]
+        if not names:
+            return
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers or len(names),
+                                thread_name_prefix="model-load") as pool:
+            for future in [pool.submit(self.get, name) for name in names]:
+                future.result()
+        self._preload_wall = time.perf_counter() - start
+
+    def report(self):
+        """Print per-model load time and memory"""
+        print("\n=== Model startup report ===")
+        print(f"{'model':<14}{'load s':>9}{'weights MB':>13}{'RSS +MB':>10}")
+
+        total = 0.0
+        for name in self._order:
+            stats = self._entries[name].stats
+            total += stats["seconds"]
+            weights = stats["weights_mb"]
+            print(
+                f"{name:<14}{stats['seconds']:>9.2f}"
+                f"{(f'{weights:.0f}' if weights is not None else '-'):>13}"
+                f"{stats['rss_delta_mb']:>10.0f}"
+            )
+
+        if self._preload_wall is not None:
+            print(f"wall time {self._preload_wall:.2f} s "
+                  f"(sum of loads {total:.2f} s; RSS deltas overlap when concurrent)")
+        print(f"process RSS {_rss_mb():.0f} MB\n")
+
+    # --------------------------------------------------
+
+    def _load(self, entry):
+        print(f"⏳ Loading {entry.name} ...")
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+
+        entry.value = entry.factory(self)
+
+        seconds = time.perf_counter() - start
+        entry.stats = {
+            "seconds": seconds,
+            "weights_mb": None if entry.deps else _weights_mb(entry.value),
+            "rss_delta_mb": max(0.0, _rss_mb() - rss_before),
+        }
+        entry.loaded = True
+        with self._order_lock:
+            self._order.append(entry.name)
+        print(f"✅ {entry.name} ready in {seconds:.2f} s")
+
+
+# --------------------------------------------------
+# Default models
+# --------------------------------------------------
+
+def _whisper_stt(registry):
+    from whisper_stt.src.hybrid_stt import load_stt_config
+    from whisper_stt.src.whisper_stt import WhisperSTT
+    _, config_path = load_stt_config()
+    return WhisperSTT(config_path)
+
+
+def _indic_stt(registry):
+    from whisper_stt.src.hybrid_stt import load_stt_config, build_indic
+    config, config_path = load_stt_config()
+    return build_indic(config, config_path)
+
+
+def _hybrid_stt(registry):
+    from whisper_stt.src.hybrid_stt import HybridSTT
+    return HybridSTT(
+        whisper_stt=registry.get("whisper_stt"),
+        indic_stt=registry.get("indic_stt"),
+    )
+
+
+def _silero_vad(registry):
+    from whisper_stt.src.hybrid_stt import load_stt_config
+    from whisper_stt.src.artifacts import artifacts_dir, warmup_enabled
+    from whisper_stt.src.vad_segmenter import load_silero_vad
+    config, config_path = load_stt_config()
+    return load_silero_vad(
+        artifacts_dir(config, config_path) / "silero_vad.jit",
+        warmup=warmup_enabled(config)
+    )
+
+
+def _qwen(registry):
+    from run_qwen_teacher import load_model
+    return load_model()
+
+
+def _qwen_draft(registry):
+    from run_qwen_teacher import load_draft
+    return load_draft()
+
+
+def _piper_tts(registry):
+    from text_to_multi_speech.src.piper_tts import PiperTTS
+    tts = PiperTTS()  # loads voice_pool.preload concurrently
+    tts.prewarm_from_config()
+    return tts
+
+
+registry = ModelRegistry()
+registry.register("whisper_stt", _whisper_stt)
+registry.register("indic_stt", _indic_stt)
+registry.register("hybrid_stt", _hybrid_stt, deps=("whisper_stt", "indic_stt"))
+registry.register("silero_vad", _silero_vad)
+registry.register("qwen", _qwen)
+registry.register("qwen_draft", _qwen_draft)
+registry.register("piper_tts", _piper_tts)
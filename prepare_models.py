@@ -0,0 +1,106 @@
+"""
+One-time "prepare" step: write every STT/VAD model to the local artifact
+directory (whisper_stt/config/config.yaml -> artifacts.dir) in the dtype
+it runs in, so later starts need no network and no conversion.
+
+    python prepare_models.py                 # whisper, indic, silero
+    python prepare_models.py --only whisper --force
+
+Artifacts:
+    whisper/<size>.safetensors   FP32 Whisper weights + dims (memory-mapped at load)
+    indic/                       Wav2Vec2 processor + model.safetensors
+    silero_vad.jit               TorchScript Silero VAD
+
+Qwen (./qwen_model_local, safetensors) and Piper (ONNX) are already
+local files and are loaded from disk as they are.
+"""
+import argparse
+import os
+import sys
+
+import torch
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from whisper_stt.src.hybrid_stt import load_stt_config
+from whisper_stt.src.artifacts import artifacts_dir
+
+STEPS = ("whisper", "indic", "silero")
+
+
+def _size_mb(path):
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(path) for name in files
+        ) / 2**20
+    return os.path.getsize(path) / 2**20
+
+
+def prepare_whisper(config, out_dir):
+    import whisper
+    from whisper_stt.src.whisper_stt import save_whisper_artifact
+
+    size = config["model"]["size"]
+    path = out_dir / "whisper" / f"{size}.safetensors"
+
+    print(f"Whisper '{size}' -> {path}")
+    model = whisper.load_model(size, device="cpu").float()
+    return save_whisper_artifact(model, path)
+
+
+def prepare_indic(config, out_dir):
+    from whisper_stt.src.indic_stt import IndicSTT
+
+    path = out_dir / "indic"
+    print(f"IndicSTT '{config['indic']['model_name']}' -> {path}")
+    indic = IndicSTT(model_path=config["indic"]["model_name"], device="cpu")
+    return indic.save_artifact(path)
+
+
+def prepare_silero(config, out_dir):
+    from whisper_stt.src.vad_segmenter import load_silero_vad
+
+    path = out_dir / "silero_vad.jit"
+    print(f"Silero VAD -> {path}")
+    vad_model = load_silero_vad(warmup=False)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(vad_model, str(path))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write local model artifacts")
+    parser.add_argument("--only", nargs="+", choices=STEPS, default=list(STEPS))
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild artifacts that already exist")
+    args = parser.parse_args()
+
+    config, config_path = load_stt_config()
+    out_dir = artifacts_dir(config, config_path)
+    print(f"=== Preparing model artifacts in {out_dir} ===\n")
+
+    existing = {
+        "whisper": out_dir / "whisper" / f"{config['model']['size']}.safetensors",
+        "indic": out_dir / "indic" / "config.json",
+        "silero": out_dir / "silero_vad.jit",
+    }
+    steps = {
+        "whisper": prepare_whisper,
+        "indic": prepare_indic,
+        "silero": prepare_silero,
+    }
+
+    for name in args.only:
+        if existing[name].exists() and not args.force:
+            print(f"✔ {name}: already prepared ({existing[name]})")
+            continue
+        path = steps[name](config, out_dir)
+        print(f"✅ {name}: {_size_mb(path):.0f} MB\n")
+
+    print("Done. Startup now loads these files (no network needed).")
+
+
+if __name__ == "__main__":
+    main()
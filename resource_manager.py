@@ -0,0 +1,158 @@
+"""
+CPU core budgeting for the in-process pipeline stages.
+
+    from resource_manager import resources
+
+    resources.configure()        # once, as early as possible
+    resources.apply("llm")       # on the thread that runs the stage
+    resources.ort_settings("tts")
+
+torch's intra-op thread count is process-wide (torch.set_num_threads()
+in one thread resizes the pool for every thread), so all torch stages
+(llm, stt, vad) share ONE budget, set once by configure(). Only ONNX
+Runtime sessions (Piper, the tts stage) can really be sized per stage,
+via ort_settings(); they are taken out of the global limit first and
+the torch stages get the rest. apply() only pins the calling thread
+(and threads it starts) to its stage's cores when pin_cores is on.
+BLAS is capped process-wide.
+"""
+import os
+import threading
+from pathlib import Path
+
+import yaml
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / "config" / "resources.yaml"
+
+# Stages that run in torch and therefore share one intra-op pool
+TORCH_STAGES = ("llm", "stt", "vad")
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+
+def _usable_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class ResourceManager:
+    def __init__(self, config=None):
+        config = config or {}
+        self.enabled = config.get("enabled", False)
+        self.interop_threads = config.get("interop_threads", 1)
+        self.pin_cores = config.get("pin_cores", False) and hasattr(os, "sched_setaffinity")
+
+        cores = _usable_cores()
+        self.max_threads = min(config.get("max_threads") or len(cores), len(cores))
+        self.cores = cores[:self.max_threads]
+
+        self.plan = self._make_plan(config.get("ort_stages") or {}, config.get("torch_threads"))
+        self.torch_threads = self.plan["llm"]["threads"]
+        self._configured = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config_path=None):
+        path = Path(config_path or DEFAULT_CONFIG_PATH)
+        if not path.exists():
+            return cls()
+        with open(path, "r") as f:
+            return cls(yaml.safe_load(f))
+
+    def _make_plan(self, ort_stages, torch_threads):
+        """stage -> {"threads": n, "cores": [...] or None}"""
+        # ORT sessions first (scaled down if they would leave torch nothing)
+        total = sum(ort_stages.values())
+        scale = min(1.0, (self.max_threads - 1) / total) if total else 1.0
+
+        plan, next_core = {}, 0
+        for stage, threads in ort_stages.items():
+            threads = max(1, int(threads * scale))
+            cores = None
+            if self.pin_cores:
+                cores = [self.cores[(next_core + i) % len(self.cores)] for i in range(threads)]
+                next_core += threads
+            plan[stage] = {"threads": threads, "cores": cores}
+
+        # ... then one shared pool for every torch stage
+        reserved = sum(p["threads"] for p in plan.values())
+        threads = max(1, min(torch_threads or self.max_threads - reserved, self.max_threads))
+        cores = None
+        if self.pin_cores:
+            left = self.cores[next_core:] or self.cores
+            cores = left[:threads]
+        for stage in TORCH_STAGES:
+            plan[stage] = {"threads": threads, "cores": cores}
+        return plan
+
+    # --------------------------------------------------
+
+    def threads(self, stage):
+        """Thread quota of a stage (None when unmanaged)"""
+        if not self.enabled or stage not in self.plan:
+            return None
+        return self.plan[stage]["threads"]
+
+    def configure(self):
+        """
+        Process-wide limits; call once at startup, ideally before numpy /
+        torch are imported so BLAS picks up the environment variables.
+        """
+        with self._lock:
+            if not self.enabled or self._configured:
+                return
+            self._configured = True
+
+        for name in BLAS_ENV_VARS:
+            os.environ.setdefault(name, str(self.torch_threads))
+
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(limits=self.torch_threads, user_api="blas")
+        except ImportError:
+            pass
+
+        import torch
+        torch.set_num_threads(self.torch_threads)  # shared by every torch stage
+        try:
+            torch.set_num_interop_threads(self.interop_threads)
+        except RuntimeError:
+            pass  # inter-op pool already started
+
+    def apply(self, stage):
+        """Pin the calling thread (and threads it starts) to the stage's cores"""
+        if self.threads(stage) is None:
+            return
+
+        cores = self.plan[stage]["cores"]
+        if cores:
+            # pid 0 = the calling thread; threads it starts inherit this
+            os.sched_setaffinity(0, cores)
+
+    def ort_settings(self, stage):
+        """ONNX Runtime session settings for a stage (see PiperTTS voice_pool)"""
+        threads = self.threads(stage)
+        if threads is None:
+            return {}
+        return {
+            "intra_op_num_threads": threads,
+            "inter_op_num_threads": 1,
+            "allow_spinning": False,  # idle ORT threads must not burn other stages' cores
+        }
+
+    def report(self):
+        if not self.enabled:
+            print("CPU budget: unmanaged (config/resources.yaml enabled: false)")
+            return
+        print(f"CPU budget: {self.max_threads} threads"
+              f"{' (pinned)' if self.pin_cores else ''}")
+        for stage, plan in self.plan.items():
+            shared = " (shared torch pool)" if stage in TORCH_STAGES else ""
+            cores = f" cores {plan['cores']}" if plan["cores"] else ""
+            print(f"  {stage:<4} {plan['threads']:>2} threads{shared}{cores}")
+
+resources = ResourceManager.from_config()
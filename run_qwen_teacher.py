@@ -1,21 +1,20 @@
 import torch
-from threading import Thread
-from transformers import (
-    AutoModelForCausalLM,
-    AutoTokenizer,
-    BitsAndBytesConfig,
-    TextIteratorStreamer,
-)
+from transformers import AutoTokenizer
 from huggingface_hub import snapshot_download
 from colorama import Fore, Style, init
 import os
 
+from llm_session import ChatSession, build_prompt
+from conversation_memory import ConversationMemory
+from llm_backends import load_backend_model, load_draft_model, load_llm_config
+
 # Initialize colorama
 init(autoreset=True)
 
 # ---------------- CONFIG ----------------
 MODEL_ID = "Qwen/Qwen2.5-3B-Instruct"
 LOCAL_MODEL_DIR = "./qwen_model_local"
+MAX_HISTORY_TOKENS = 2048  # prompt budget; oldest turns are dropped beyond it
 
 SYSTEM_PROMPT = """You are Qwen Teacher, a helpful AI assistant for children.
 
@@ -30,7 +29,13 @@ Rules:
 
 # ----------------------------------------
 
-def load_model():
+def load_model(backend=None, config_path=None):
+    """
+    Load Qwen with the backend selected in config/llm.yaml
+    (or the `backend` argument, which takes precedence).
+    """
+    config = load_llm_config(config_path)
+
     print(f"{Fore.CYAN}Checking model files...{Style.RESET_ALL}")
 
     if not os.path.exists(LOCAL_MODEL_DIR) or not os.listdir(LOCAL_MODEL_DIR):
@@ -41,15 +46,6 @@ def load_model():
             ignore_patterns=["*.pt", "*.bin"],
         )
 
-    print(f"{Fore.CYAN}Loading model (4-bit NF4)...{Style.RESET_ALL}")
-
-    bnb_config = BitsAndBytesConfig(
-        load_in_4bit=True,
-        bnb_4bit_quant_type="nf4",
-        bnb_4bit_compute_dtype=torch.float16,
-        bnb_4bit_use_double_quant=True,
-    )
-
     tokenizer = AutoTokenizer.from_pretrained(
         LOCAL_MODEL_DIR, trust_remote_code=True
     )
@@ -57,37 +53,53 @@ def load_model():
     if tokenizer.pad_token is None:
         tokenizer.pad_token = tokenizer.eos_token
 
-    model = AutoModelForCausalLM.from_pretrained(
-        LOCAL_MODEL_DIR,
-        quantization_config=bnb_config,
-        device_map="auto",
-        trust_remote_code=True,
+    model, backend = load_backend_model(
+        LOCAL_MODEL_DIR, backend=backend, config=config
     )
 
+    print(f"{Fore.CYAN}Model loaded (backend: {backend}){Style.RESET_ALL}")
+
     return model, tokenizer
 
 
+def load_draft(backend=None, config_path=None):
+    """
+    Load the speculative-decoding draft model if it is enabled in
+    config/llm.yaml; returns None otherwise.
+    """
+    config = load_llm_config(config_path)
+    spec = config.get("speculative") or {}
+    if not spec.get("enabled"):
+        return None
+
+    draft_dir = spec["draft_local_dir"]
+    if not os.path.exists(draft_dir) or not os.listdir(draft_dir):
+        print(f"{Fore.YELLOW}Downloading draft model (one-time)...{Style.RESET_ALL}")
+        snapshot_download(
+            repo_id=spec["draft_model_id"],
+            local_dir=draft_dir,
+            ignore_patterns=["*.pt", "*.bin"],
+        )
+
+    draft = load_draft_model(draft_dir, backend=backend, config=config)
+    if draft is not None:
+        print(f"{Fore.CYAN}Draft model loaded: {spec['draft_model_id']}{Style.RESET_ALL}")
+
+    return draft
+
+
 # ======================================================
 # ✅ PROGRAMMATIC API (USED BY VOICE BOT)
 # ======================================================
-def ask_llm(model, tokenizer, messages, max_new_tokens=256):
+def ask_llm(model, tokenizer, messages, max_new_tokens=256, assistant_model=None):
     """
     Generate a response from Qwen (non-streaming).
     Used by run_teacherbot_voice.py
+
+    assistant_model: optional draft model (see load_draft) for
+    speculative decoding.
     """
-    try:
-        prompt = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True,
-            enable_thinking=False,
-        )
-    except TypeError:
-        prompt = tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True,
-        )
+    prompt = build_prompt(tokenizer, messages)
 
     inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
 
@@ -99,6 +111,7 @@ def ask_llm(model, tokenizer, messages, max_new_tokens=256):
             do_sample=True,
             repetition_penalty=1.1,
             eos_token_id=tokenizer.eos_token_id,
+            assistant_model=assistant_model,
         )
 
     response = tokenizer.decode(
@@ -116,7 +129,14 @@ def main():
     print(f"{Fore.GREEN}=== Qwen TeacherBot (Local, Offline) ==={Style.RESET_ALL}")
 
     model, tokenizer = load_model()
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    draft = load_draft()
+    memory = ConversationMemory(
+        tokenizer, SYSTEM_PROMPT, max_tokens=MAX_HISTORY_TOKENS
+    )
+
+    # Persistent KV cache across turns; system prompt prefilled once
+    session = ChatSession(model, tokenizer, assistant_model=draft)
+    session.prime(memory.messages)
 
     print(f"{Fore.GREEN}Teacher ready. Type 'exit' to quit.{Style.RESET_ALL}")
     print("-" * 50)
@@ -131,31 +151,16 @@ def main():
             if not user_input.strip():
                 continue
 
-            messages.append({"role": "user", "content": user_input})
+            memory.add("user", user_input)
 
-            prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True,
-            )
-
-            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-
-            streamer = TextIteratorStreamer(
-                tokenizer, skip_prompt=True, skip_special_tokens=True
-            )
-
-            generation_kwargs = dict(
-                inputs,
-                streamer=streamer,
+            # Only the new user turn is prefilled; history stays cached
+            streamer = session.stream(
+                memory.messages,
                 max_new_tokens=256,
                 temperature=0.7,
                 do_sample=True,
             )
 
-            thread = Thread(target=model.generate, kwargs=generation_kwargs)
-            thread.start()
-
             print(f"{Fore.YELLOW}Teacher: {Style.RESET_ALL}", end="", flush=True)
 
             response_text = ""
@@ -163,8 +168,17 @@ def main():
                 print(token, end="", flush=True)
                 response_text += token
 
+            session.wait()
+            if session.last_stats:
+                stats = session.last_stats
+                print(
+                    f"\n{Fore.CYAN}Draft acceptance: {stats['acceptance_rate']:.0%} "
+                    f"({stats['accepted_tokens']}/{stats['draft_tokens']}){Style.RESET_ALL}",
+                    end=""
+                )
+
             print("\n" + "-" * 50)
-            messages.append({"role": "assistant", "content": response_text})
+            memory.add("assistant", response_text)
 
         except KeyboardInterrupt:
             print("\nExiting...")
@@ -1,9 +1,6 @@
 import sys
 import os
-import re
-from threading import Thread
-
-from transformers import TextIteratorStreamer
+import threading
 
 # -------------------------------------------------
 # Path setup
@@ -11,22 +8,21 @@ from transformers import TextIteratorStreamer
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, BASE_DIR)
 
-from whisper_stt.src.stt_interface import listen_and_transcribe
-from text_to_multi_speech.src.piper_tts import PiperTTS
-from run_qwen_teacher import load_model
+# CPU budget first: BLAS reads its thread limits when it is loaded
+from resource_manager import resources
+resources.configure()
 
-# -------------------------------------------------
-# System Prompt (STRICT LANGUAGE CONTROL)
-# -------------------------------------------------
-SYSTEM_PROMPT = """You are TeacherBot, a strict bilingual teacher.
+from text_to_multi_speech.src.speech_pipeline import SpeechPipeline
+from text_to_multi_speech.src.text_chunker import TextChunker
+from model_registry import registry
+from latency_tracer import tracer
+from llm_session import ChatSession
+from conversation_memory import ConversationMemory
+from prompts import SYSTEM_PROMPT, MAX_HISTORY_TOKENS
 
-MANDATORY RULES:
-- If the user speaks English, reply ONLY in English.
-- If the user speaks Malayalam, reply ONLY in Malayalam.
-- NEVER mix languages.
-- NEVER translate unless explicitly asked.
-- Keep answers short, clear, and suitable for voice output.
-"""
+# Speaking over the bot stops it (needs a headset or echo cancellation,
+# otherwise the bot's own voice can interrupt it)
+BARGE_IN = True
 
 # -------------------------------------------------
 # Output language detection (safety net)
@@ -38,101 +34,185 @@ def detect_output_language(text: str) -> str:
             return "ml"
     return "en"
 
+# -------------------------------------------------
+# One reply: generate, speak while generating
+# -------------------------------------------------
+def respond(session, memory, chunker, speech, user_text, lang, max_new_tokens=256,
+            interrupted=None):
+    """
+    Answer one user turn out loud; returns the reply as heard.
+
+    `interrupted` is an Event set on barge-in (after session.cancel() and
+    speech.cancel()): the reply is cut short and only the part actually
+    spoken is saved.
+    """
+    interrupted = interrupted or threading.Event()
+
+    # Read before checking `interrupted`: speech and generation from this
+    # reply are dropped by any cancel() after this point, even one that
+    # races with submit() / session.stream()
+    epoch = speech.epoch
+    llm_epoch = session.epoch
+
+    # ---- HARD language tag for the LLM ----
+    memory.add("user", f"[LANG={lang.upper()}] {user_text}")
+
+    if interrupted.is_set():
+        # Still talking after the endpoint: answer once they are done
+        return ""
+
+    print("🤖 Teacher: ", end="", flush=True)
+
+    # ---- Generate in background (incremental prefill) ----
+    tracer.mark("llm_start")
+    streamer = session.stream(
+        memory.messages,
+        epoch=llm_epoch,
+        max_new_tokens=max_new_tokens,   # 🔥 reduced for voice UX
+        temperature=0.7,
+        do_sample=True,
+    )
+
+    full_response = ""
+    chunker.reset()
+
+    # ---- Stream + speak chunk-by-chunk (short first chunk) ----
+    for token in streamer:
+        if interrupted.is_set():
+            break
+        tracer.mark("llm_first_token")
+        print(token, end="", flush=True)
+        full_response += token
+
+        for chunk in chunker.push(token):
+            speech.submit(chunk, language=detect_output_language(chunk), epoch=epoch)
+
+    if interrupted.is_set():
+        # Barge-in may have come before generation started
+        session.cancel()
+
+    # Speak remaining fragment
+    if not interrupted.is_set():
+        for chunk in chunker.flush():
+            speech.submit(chunk, language=detect_output_language(chunk), epoch=epoch)
+
+    # Don't listen again until the answer has been played
+    speech.wait()
+    tracer.mark("playback_end")
+
+    session.wait()
+    tracer.update(session.last_timing, prefix="llm_")
+    if session.last_stats:
+        stats = session.last_stats
+        print(
+            f"\n⚡ Draft acceptance: {stats['acceptance_rate']:.0%} "
+            f"({stats['accepted_tokens']}/{stats['draft_tokens']})",
+            end=""
+        )
+    print()
+
+    # Save assistant message (only what was heard, if interrupted)
+    spoken = speech.take_spoken()
+    if interrupted.is_set():
+        full_response = spoken
+        print(f"✋ Interrupted; heard: {spoken!r}")
+    if full_response:
+        memory.add("assistant", full_response)
+    return full_response
+
 # -------------------------------------------------
 # Main loop
 # -------------------------------------------------
 def main():
+    # Imported here: other entry points (e.g. teacherbot_server.py) import
+    # this module for its prompt/config and do not need the mic stack.
+    from whisper_stt.src.stt_interface import listen_and_transcribe, get_segmenter
+
     print("=== TeacherBot Voice Assistant ===")
     print("Speak naturally. Press Ctrl+C to exit.\n")
 
-    # Load LLM (GPU)
-    model, tokenizer = load_model()
+    resources.report()
+    resources.apply("stt")  # the main thread runs offline STT fallbacks
+
+    # Load every model once, independent ones in parallel
+    registry.preload(["hybrid_stt", "silero_vad", "qwen", "qwen_draft", "piper_tts"])
+    registry.report()
+
+    model, tokenizer = registry.get("qwen")
+    draft = registry.get("qwen_draft")  # None unless speculative decoding is enabled
+
+    # TTS (CPU): synthesis and playback overlap with generation
+    tts = registry.get("piper_tts")
+    speech = SpeechPipeline(tts)
+    speech.start()
+
+    # Cuts streamed text into speakable chunks, scanning only new tokens
+    chunker = TextChunker(**(tts.config.get("chunking") or {}))
+
+    # Conversation memory (token-budgeted; system prompt always kept)
+    memory = ConversationMemory(
+        tokenizer, SYSTEM_PROMPT, max_tokens=MAX_HISTORY_TOKENS
+    )
+
+    # Persistent KV cache: system prompt prefilled once, then each turn
+    # only prefills the newly appended tokens
+    session = ChatSession(model, tokenizer, assistant_model=draft)
+    session.prime(memory.messages)
+
+    # Full duplex: the VAD keeps running while the bot thinks and talks
+    barge_in = threading.Event()
 
-    # Init TTS (CPU)
-    tts = PiperTTS()
+    def on_barge_in():
+        if barge_in.is_set():
+            return
+        barge_in.set()
+        tracer.mark("barge_in")
+        session.cancel()
+        speech.cancel()
 
-    # Conversation memory
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if BARGE_IN:
+        get_segmenter().on_barge_in = on_barge_in
 
     while True:
+        # Every started turn is recorded, including empty and failed ones
+        info = {"status": "ok"}
         try:
             print("🎙️ Listening...")
-            result = listen_and_transcribe()
+            tracer.start_turn()
+            keep_pending = barge_in.is_set()  # the interruption is the next utterance
+            barge_in.clear()
+            result = listen_and_transcribe(keep_pending=keep_pending)
+            tracer.mark("stt_done")
 
             if not result or not result["text"].strip():
+                info["status"] = "empty"
                 continue
 
             user_text = result["text"]
             lang = result["language"]  # "en" or "ml"
+            info.update(language=lang, engine=result["engine"])
 
             print(f"\n👤 User ({lang}): {user_text}")
 
-            # ---- HARD language tag for the LLM ----
-            messages.append({
-                "role": "user",
-                "content": f"[LANG={lang.upper()}] {user_text}"
-            })
-
-            print("🤖 Teacher: ", end="", flush=True)
-
-            # ---- Build prompt ----
-            prompt = tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True,
-            )
-
-            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-
-            streamer = TextIteratorStreamer(
-                tokenizer,
-                skip_prompt=True,
-                skip_special_tokens=True
-            )
-
-            generation_kwargs = dict(
-                **inputs,
-                streamer=streamer,
-                max_new_tokens=256,   # 🔥 reduced for voice UX
-                temperature=0.7,
-                do_sample=True,
-            )
-
-            # Run generation in background
-            thread = Thread(target=model.generate, kwargs=generation_kwargs)
-            thread.start()
-
-            spoken_buffer = ""
-            full_response = ""
-
-            # ---- Stream + speak sentence-by-sentence ----
-            for token in streamer:
-                print(token, end="", flush=True)
-                full_response += token
-                spoken_buffer += token
-
-                # Sentence boundary (English + Malayalam)
-                if re.search(r"[.!?]|[।]", spoken_buffer):
-                    out_lang = detect_output_language(spoken_buffer)
-                    tts.speak(spoken_buffer.strip(), language=out_lang)
-                    spoken_buffer = ""
-
-            # Speak remaining fragment
-            if spoken_buffer.strip():
-                out_lang = detect_output_language(spoken_buffer)
-                tts.speak(spoken_buffer.strip(), language=out_lang)
-
-            print("\n" + "-" * 50)
-
-            # Save assistant message
-            messages.append({
-                "role": "assistant",
-                "content": full_response
-            })
+            respond(session, memory, chunker, speech, user_text, lang, interrupted=barge_in)
+            info["barge_in"] = barge_in.is_set()
+            print("-" * 50)
 
         except KeyboardInterrupt:
-            print("\nGoodbye!")
+            tracer.discard_turn()
+            report = registry.get("hybrid_stt").whisper.decoding_report()
+            print(f"\nWhisper beam fallback: {report['beam_fallbacks']}/"
+                  f"{report['greedy_decodes']} decodes ({report['fallback_rate']:.0%})")
+            print("Goodbye!")
             break
+        except Exception:
+            info["status"] = "error"
+            raise
+        finally:
+            tracer.finish_turn(**info)  # no-op once discarded
+
+    speech.close()
+    tts.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+"""
+Multi-session TeacherBot server (HTTP, local network).
+
+One process serves several classroom devices. Each device opens a
+session and posts utterances; STT and the LLM are shared:
+
+- Whisper language ID + encoder calls from concurrent sessions are
+  micro-batched into one encoder pass, and English decodes are batched
+  the same way. The two batches take turns on the one Whisper model.
+- Qwen runs under continuous batching: every active reply advances in
+  the same decode step, and each session keeps its own KV prefix.
+
+Endpoints:
+    POST   /sessions                        -> {"session_id": ...}
+    POST   /sessions/<id>/turn?sample_rate=16000
+           body: float32 mono PCM (application/octet-stream) or audio/wav
+    POST   /sessions/<id>/text              body: {"text": ..., "language": "en"}
+    DELETE /sessions/<id>
+    GET    /stats
+
+    python teacherbot_server.py --port 8765 --max-batch-size 4
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from transformers import PreTrainedModel
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+from whisper_stt.src.batching import MicroBatcher
+from whisper_stt.src.audio_utils import to_mono_float32
+from model_registry import registry
+from resource_manager import resources
+from llm_session import build_prompt
+from llm_batching import ContinuousBatcher, SessionCache
+from conversation_memory import ConversationMemory
+from prompts import SYSTEM_PROMPT, MAX_HISTORY_TOKENS
+
+
+class ServerSession:
+    """Per-device conversation state"""
+
+    def __init__(self, tokenizer):
+        self.id = uuid.uuid4().hex
+        self.memory = ConversationMemory(
+            tokenizer, SYSTEM_PROMPT, max_tokens=MAX_HISTORY_TOKENS
+        )
+        self.cache = SessionCache()
+        self.lock = threading.Lock()   # one turn at a time per session
+
+
+class VoiceServer:
+    def __init__(self, stt, model, tokenizer, max_batch_size=4, max_wait_ms=20):
+        if not isinstance(model, PreTrainedModel):
+            raise ValueError("Server mode needs a transformers (torch) LLM backend")
+
+        self.stt = stt
+        self.tokenizer = tokenizer
+
+        # whisper.decode hooks the shared decoder for its KV cache, so LID,
+        # English decodes and the long-form fallback must never overlap
+        self.whisper_lock = threading.Lock()
+
+        stt_budget = lambda: resources.apply("stt")
+        self.lid = MicroBatcher(
+            self._with_whisper(stt.detect_language_batch), max_batch_size, max_wait_ms,
+            name="whisper-lid", on_start=stt_budget
+        ).start()
+        self.english = MicroBatcher(
+            self._with_whisper(stt.transcribe_english_batch), max_batch_size, max_wait_ms,
+            name="whisper-en", on_start=stt_budget
+        ).start()
+        self.indic_lock = threading.Lock()
+
+        self.llm = ContinuousBatcher(model, tokenizer, max_batch_size).start()
+
+        self.sessions = {}
+        self._sessions_lock = threading.Lock()
+
+    def _with_whisper(self, batch_fn):
+        def run(items):
+            with self.whisper_lock:
+                return batch_fn(items)
+        return run
+
+    # --------------------------------------------------
+
+    def create_session(self):
+        session = ServerSession(self.tokenizer)
+        with self._sessions_lock:
+            self.sessions[session.id] = session
+        return session.id
+
+    def close_session(self, session_id):
+        with self._sessions_lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def get_session(self, session_id):
+        with self._sessions_lock:
+            return self.sessions.get(session_id)
+
+    # --------------------------------------------------
+
+    def transcribe(self, audio):
+        audio = audio / max(1e-6, np.max(np.abs(audio)))
+
+        lang, features = self.lid.submit(audio)
+        if lang == "en":
+            return self.english.submit((audio, features))
+
+        with self.indic_lock:
+            result = self.stt.indic.transcribe(audio_array=audio)
+        result["engine"] = "indic"
+        result["language"] = "ml"
+        return result
+
+    def reply(self, session, user_text, lang):
+        with session.lock:
+            session.memory.add("user", f"[LANG={lang.upper()}] {user_text}")
+
+            prompt = build_prompt(self.tokenizer, session.memory.messages)
+            streamer = self.llm.submit(
+                self.tokenizer(prompt)["input_ids"],
+                max_new_tokens=256,
+                temperature=0.7,
+                session_cache=session.cache,
+            )
+            # Raises if generation failed: nothing is stored as the reply
+            reply = "".join(streamer).strip()
+
+            session.memory.add("assistant", reply)
+            return reply
+
+    def turn(self, session, audio):
+        start = time.perf_counter()
+        result = self.transcribe(audio)
+        stt_done = time.perf_counter()
+
+        text = result["text"].strip()
+        reply = self.reply(session, text, result["language"]) if text else ""
+
+        return {
+            "text": text,
+            "language": result["language"],
+            "engine": result["engine"],
+            "reply": reply,
+            "stt_latency": stt_done - start,
+            "llm_latency": time.perf_counter() - stt_done,
+        }
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "whisper_lid_mean_batch": self.lid.mean_batch_size,
+            "whisper_en_mean_batch": self.english.mean_batch_size,
+            "llm_mean_batch": self.llm.mean_batch_size,
+            "llm_active": len(self.llm.active),
+            "whisper_decoding": self.stt.whisper.decoding_report(),
+        }
+
+
+# --------------------------------------------------
+# HTTP layer
+# --------------------------------------------------
+
+def read_audio(body, content_type, sample_rate):
+    """Request body -> (float32 mono audio, sample_rate)"""
+    if content_type.startswith("audio/wav") or content_type.startswith("audio/x-wav"):
+        with wave.open(io.BytesIO(body), "rb") as wf:
+            if wf.getsampwidth() != 2:
+                raise ValueError("Only 16-bit WAV is supported")
+            sample_rate = wf.getframerate()
+            audio = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            audio = audio.reshape(-1, wf.getnchannels())
+        return audio, sample_rate
+
+    return np.frombuffer(body, dtype="<f4"), sample_rate
+
+
+def make_handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, status, payload):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _session(self, parts):
+            session = server.get_session(parts[1]) if len(parts) > 1 else None
+            if session is None:
+                self._send(404, {"error": "unknown session"})
+            return session
+
+        def do_GET(self):
+            if urlparse(self.path).path.strip("/") == "stats":
+                self._send(200, server.stats())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+
+            if parts[0] != "sessions":
+                return self._send(404, {"error": "not found"})
+
+            if len(parts) == 1:
+                return self._send(201, {"session_id": server.create_session()})
+
+            session = self._session(parts)
+            if session is None:
+                return
+
+            try:
+                if parts[2:] == ["turn"]:
+                    query = parse_qs(url.query)
+                    sample_rate = int(query.get("sample_rate", ["16000"])[0])
+                    audio, sample_rate = read_audio(
+                        self._body(), self.headers.get("Content-Type", ""), sample_rate
+                    )
+                    audio = to_mono_float32(audio, sample_rate)
+                    return self._send(200, server.turn(session, audio))
+
+                if parts[2:] == ["text"]:
+                    request = json.loads(self._body() or b"{}")
+                    lang = request.get("language", "en")
+                    reply = server.reply(session, request["text"], lang)
+                    return self._send(200, {"reply": reply})
+
+                self._send(404, {"error": "not found"})
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                # Model/runtime failure: still answer, and keep serving
+                print(f"❌ {url.path}: {type(e).__name__}: {e}")
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def do_DELETE(self):
+            parts = urlparse(self.path).path.strip("/").split("/")
+            if parts[0] == "sessions" and len(parts) == 2 and server.close_session(parts[1]):
+                self._send(200, {"closed": parts[1]})
+            else:
+                self._send(404, {"error": "unknown session"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session TeacherBot server")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="no authentication: use 0.0.0.0 only on a trusted network")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=4)
+    parser.add_argument("--max-wait-ms", type=int, default=20,
+                        help="how long STT batches wait for more sessions")
+    args = parser.parse_args()
+
+    resources.configure()
+    resources.report()
+
+    registry.preload(["hybrid_stt", "qwen"])
+    registry.report()
+
+    stt = registry.get("hybrid_stt")
+    model, tokenizer = registry.get("qwen")
+    server = VoiceServer(
+        stt, model, tokenizer,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+    )
+
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(server))
+    print(f"=== TeacherBot server on http://{args.host}:{args.port} ===")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from .piper_tts import PiperTTS
+from .speech_pipeline import SpeechPipeline
+from .text_chunker import TextChunker
 
 __version__ = "0.1.0"
-__all__ = ["PiperTTS"]
+__all__ = ["PiperTTS", "SpeechPipeline", "TextChunker"]
 
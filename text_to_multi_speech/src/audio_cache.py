@@ -0,0 +1,153 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import wave
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def normalize_text(text):
+    """Cache key form of a phrase: NFC, single spaces, no outer whitespace"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class AudioCache:
+    """
+    LRU cache of synthesized speech, keyed by voice + normalized text.
+
+    The memory tier holds float32 PCM up to `max_memory_mb`. The optional
+    disk tier (`disk_dir`, 16-bit WAV files) survives restarts and is
+    trimmed to `max_disk_mb`, oldest-used first. Both tiers are safe to
+    use from several threads.
+    """
+
+    def __init__(self, max_memory_mb=64, disk_dir=None, max_disk_mb=512):
+        self.max_memory_bytes = int(max_memory_mb * 2**20)
+        self.max_disk_bytes = int(max_disk_mb * 2**20)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries = OrderedDict()   # key -> (audio, sample_rate)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(voice, text):
+        return hashlib.sha1(f"{voice}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, voice, text):
+        """-> (audio, sample_rate) or None"""
+        key = self.key(voice, text)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, entry)
+        return entry
+
+    def put(self, voice, text, audio, sample_rate):
+        key = self.key(voice, text)
+        entry = (np.ascontiguousarray(audio, dtype=np.float32), sample_rate)
+
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def clear(self):
+        """Drop the memory tier (disk files are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / total if total else 0.0
+
+    # --------------------------------------------------
+
+    def _store(self, key, entry):
+        if key in self._entries:
+            self._memory_bytes -= self._entries.pop(key)[0].nbytes
+        if entry[0].nbytes > self.max_memory_bytes:
+            return
+
+        self._entries[key] = entry
+        self._memory_bytes += entry[0].nbytes
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (audio, _) = self._entries.popitem(last=False)
+            self._memory_bytes -= audio.nbytes
+
+    def _path(self, key):
+        return self.disk_dir / f"{key}.wav"
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with wave.open(str(path), "rb") as wf:
+                sample_rate = wf.getframerate()
+                pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            os.utime(path)  # mark as recently used for trimming
+        except (OSError, EOFError, wave.Error):
+            return None
+        return pcm.astype(np.float32) / 32767, sample_rate
+
+    def _write_disk(self, key, entry):
+        if self.disk_dir is None:
+            return
+        audio, sample_rate = entry
+        path = self._path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        try:
+            with wave.open(str(tmp), "wb") as wf:
+                wf.setnchannels(1)
+                wf.setsampwidth(2)
+                wf.setframerate(sample_rate)
+                wf.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"TTS cache write failed: {e}")
+            return
+
+        self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for path in self.disk_dir.glob("*.wav"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # removed by another writer
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except OSError:
+                pass
@@ -4,19 +4,64 @@ from pathlib import Path
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root.parent))  # repo root (audio_io)
 
 import yaml
 import wave
 from pathlib import Path
-from piper import PiperVoice
-import sounddevice as sd
+import json
+from concurrent.futures import ThreadPoolExecutor
+import onnxruntime
+from piper import PiperVoice, PiperConfig
 import numpy as np
-import tempfile
-import os
+import threading
+
+from .audio_cache import AudioCache
+
+try:
+    from resource_manager import resources  # repo-level CPU budget (optional)
+except ImportError:
+    resources = None
+
+from audio_io import get_audio_backend  # pluggable mic/speaker (repo root)
 
 
 from pathlib import Path
 
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def _session_options(settings):
+    """voice_pool settings dict -> onnxruntime.SessionOptions"""
+    options = onnxruntime.SessionOptions()
+    
+    if settings.get('intra_op_num_threads') is not None:
+        options.intra_op_num_threads = int(settings['intra_op_num_threads'])
+    if settings.get('inter_op_num_threads') is not None:
+        options.inter_op_num_threads = int(settings['inter_op_num_threads'])
+    if settings.get('graph_optimization_level') is not None:
+        level = GRAPH_OPTIMIZATION_LEVELS[settings['graph_optimization_level']]
+        options.graph_optimization_level = getattr(onnxruntime.GraphOptimizationLevel, level)
+    if settings.get('execution_mode') is not None:
+        mode = "ORT_PARALLEL" if settings['execution_mode'] == "parallel" else "ORT_SEQUENTIAL"
+        options.execution_mode = getattr(onnxruntime.ExecutionMode, mode)
+    if settings.get('enable_cpu_mem_arena') is not None:
+        options.enable_cpu_mem_arena = bool(settings['enable_cpu_mem_arena'])
+    if settings.get('enable_mem_pattern') is not None:
+        options.enable_mem_pattern = bool(settings['enable_mem_pattern'])
+    if settings.get('allow_spinning') is not None:
+        options.add_session_config_entry(
+            "session.intra_op.allow_spinning", "1" if settings['allow_spinning'] else "0"
+        )
+    
+    return options
+
+
 class PiperTTS:
     def __init__(self, config_path=None):
         # Resolve config path safely
@@ -35,6 +80,26 @@ class PiperTTS:
         
         self.current_language = self.config['default_language']
         self.voices = {}
+        self._voice_locks = {}
+        
+        # One long-lived output stream shared by every play() call
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        
+        # Rendered-audio cache for repeated phrases
+        cache_config = self.config.get('cache') or {}
+        self.cache = None
+        if cache_config.get('enabled', False):
+            disk_dir = cache_config.get('disk_dir')
+            self.cache = AudioCache(
+                max_memory_mb=cache_config.get('max_memory_mb', 64),
+                disk_dir=base_dir / disk_dir if disk_dir else None,
+                max_disk_mb=cache_config.get('max_disk_mb', 512)
+            )
+        
+        # Load the configured voice pool up front, in parallel, so the
+        # first reply in another language does not stall on a model load
+        self.preload_voices()
         
         print("Piper TTS initialized")
     
@@ -46,6 +111,49 @@ class PiperTTS:
         if language in self.voices:
             return self.voices[language]
         
+        with self._voice_locks.setdefault(language, threading.Lock()):
+            if language not in self.voices:
+                print(f"Loading {language} voice model...")
+                self.voices[language] = self.create_voice(language)
+                print(f"{language} voice loaded successfully!")
+        
+        return self.voices[language]
+    
+    def preload_voices(self, languages=None):
+        """Load several voices concurrently (default: voice_pool.preload)"""
+        if languages is None:
+            languages = (self.config.get('voice_pool') or {}).get('preload') or []
+        if not languages:
+            return
+        
+        # ORT threads inherit the (tts-pinned) affinity of the creating thread
+        init = (lambda: resources.apply("tts")) if resources is not None else None
+        with ThreadPoolExecutor(max_workers=len(languages), initializer=init) as pool:
+            futures = {lang: pool.submit(self.load_voice, lang) for lang in languages}
+        
+        for language, future in futures.items():
+            try:
+                future.result()
+            except (FileNotFoundError, ValueError) as e:
+                print(f"Voice '{language}' not preloaded: {e}")
+    
+    def session_settings(self, language):
+        """
+        ONNX Runtime settings for a voice: voice_pool.session_defaults, then
+        the tts CPU budget (config/resources.yaml), then per-voice overrides
+        """
+        pool = self.config.get('voice_pool') or {}
+        settings = dict(pool.get('session_defaults') or {})
+        if resources is not None:
+            settings.update(resources.ort_settings("tts"))
+        settings.update((pool.get('sessions') or {}).get(language) or {})
+        return settings
+    
+    def create_voice(self, language, session_settings=None):
+        """
+        Build a new PiperVoice (not cached) with the given ONNX Runtime
+        settings; defaults to session_settings(language).
+        """
         voice_config = self.config['voices'][language]
         model_name = voice_config['model']
         lang_code = voice_config['language_code']
@@ -61,12 +169,20 @@ class PiperTTS:
             print(f"Download from: https://huggingface.co/rhasspy/piper-voices")
             raise FileNotFoundError(f"Model not found: {model_path}")
         
-        print(f"Loading {language} voice model...")
-        voice = PiperVoice.load(str(model_path), config_path=str(config_path))
-        self.voices[language] = voice
-        print(f"{language} voice loaded successfully!")
+        if session_settings is None:
+            session_settings = self.session_settings(language)
         
-        return voice
+        with open(config_path, 'r', encoding='utf-8') as f:
+            voice_json = json.load(f)
+        
+        return PiperVoice(
+            config=PiperConfig.from_dict(voice_json),
+            session=onnxruntime.InferenceSession(
+                str(model_path),
+                sess_options=_session_options(session_settings),
+                providers=["CPUExecutionProvider"]
+            )
+        )
     
     def speak(self, text, language=None, save_to_file=None):
         """
@@ -77,58 +193,173 @@ class PiperTTS:
             language: Language code ('en', 'ml', 'ar')
             save_to_file: Optional path to save audio file
         """
+        if save_to_file:
+            audio_np, sample_rate = self.synthesize(
+                text, language=language, save_to_file=save_to_file
+            )
+            self.play(audio_np, sample_rate)
+        else:
+            self.speak_stream(text, language=language)
+    
+    def speak_stream(self, text, language=None):
+        """Play audio chunks as soon as Piper produces them"""
+        if language is None:
+            language = self.current_language
+        
+        sample_rate = self.get_sample_rate(language)
+        for chunk in self.synthesize_pcm(text, language=language):
+            self.play(chunk, sample_rate)
+    
+    def synthesize_pcm(self, text, language=None):
+        """
+        Yield float32 audio chunks (one per sentence) directly from the
+        Piper voice, without touching the filesystem
+        """
         if language is None:
             language = self.current_language
         
         voice = self.load_voice(language)
+        voice_id = self.config['voices'][language]['model']
         
-        # Use synthesize_wav for better quality
-        # Create temporary file or use provided filename
-        if save_to_file:
-            output_file = save_to_file
-            temp_file = False
+        # Cache hit: no ONNX inference, the whole phrase is ready at once
+        if self.cache is not None:
+            cached = self.cache.get(voice_id, text)
+            if cached is not None:
+                yield cached[0]
+                return
+        
+        chunks = []
+        for chunk in voice.synthesize(text):
+            audio = np.asarray(chunk.audio_float_array, dtype=np.float32)
+            chunks.append(audio)
+            yield audio
+        
+        if self.cache is not None and chunks:
+            self.cache.put(voice_id, text, np.concatenate(chunks), voice.config.sample_rate)
+    
+    def prewarm(self, phrases, language=None):
+        """
+        Render phrases into the cache ahead of time (e.g. greetings and
+        fixed lesson lines). Phrases already cached are skipped.
+        Returns {'rendered': synthesized now, 'cached': already there}.
+        """
+        counts = {"rendered": 0, "cached": 0}
+        if self.cache is None:
+            return counts
+        
+        if language is None:
+            language = self.current_language
+        self.load_voice(language)
+        voice_id = self.config['voices'][language]['model']
+        
+        for phrase in phrases:
+            if self.cache.get(voice_id, phrase) is not None:
+                counts["cached"] += 1
+                continue
+            for _ in self.synthesize_pcm(phrase, language=language):
+                pass
+            counts["rendered"] += 1
+        return counts
+    
+    def prewarm_from_config(self):
+        """Pre-warm the phrase lists under cache.phrases in config.yaml"""
+        phrases = (self.config.get('cache') or {}).get('phrases') or {}
+        for language, items in phrases.items():
+            try:
+                counts = self.prewarm(items, language=language)
+                print(f"TTS cache: '{language}' phrases ready "
+                      f"({counts['rendered']} rendered, {counts['cached']} already cached)")
+            except (FileNotFoundError, ValueError) as e:
+                print(f"TTS cache: skipped '{language}' phrases ({e})")
+    
+    def synthesize(self, text, language=None, save_to_file=None):
+        """
+        Synthesize speech without playing it
+        
+        Returns:
+            (audio, sample_rate) with float32 audio in [-1, 1]
+        """
+        if language is None:
+            language = self.current_language
+        
+        sample_rate = self.get_sample_rate(language)
+        chunks = list(self.synthesize_pcm(text, language=language))
+        
+        if chunks:
+            audio_np = np.concatenate(chunks)
         else:
-            fd, output_file = tempfile.mkstemp(suffix='.wav')
-            os.close(fd)
-            temp_file = True
-        
-        try:
-            # Synthesize to WAV file
-            with wave.open(output_file, "wb") as wav_file:
-                voice.synthesize_wav(text, wav_file)
-            
-            if save_to_file:
-                print(f"Audio saved to {save_to_file}")
-            
-            # Play the audio
-            self._play_wav(output_file)
-            
-        finally:
-            # Clean up temp file if created
-            if temp_file and os.path.exists(output_file):
-                os.unlink(output_file)
-    
-    def _play_wav(self, filename):
-        """Play a WAV file using sounddevice"""
-        with wave.open(filename, 'rb') as wf:
-            sample_rate = wf.getframerate()
-            n_channels = wf.getnchannels()
-            n_frames = wf.getnframes()
-            audio = wf.readframes(n_frames)
-            
-            # Convert byte data to numpy array
-            audio_np = np.frombuffer(audio, dtype=np.int16)
-            
-            # If stereo, reshape for sounddevice
-            if n_channels == 2:
-                audio_np = audio_np.reshape(-1, 2)
+            audio_np = np.zeros(0, dtype=np.float32)
+        
+        if save_to_file:
+            self._write_wav(save_to_file, audio_np, sample_rate)
+            print(f"Audio saved to {save_to_file}")
+        
+        return audio_np, sample_rate
+    
+    def get_sample_rate(self, language=None):
+        """Output sample rate of the voice for a language"""
+        if language is None:
+            language = self.current_language
+        return self.load_voice(language).config.sample_rate
+    
+    def _write_wav(self, filename, audio_np, sample_rate):
+        """Write float32 audio as a 16-bit mono WAV file"""
+        audio_int16 = (np.clip(audio_np, -1.0, 1.0) * 32767).astype(np.int16)
+        with wave.open(str(filename), "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(sample_rate)
+            wf.writeframes(audio_int16.tobytes())
+    
+    def _get_output_stream(self, sample_rate, channels):
+        """Open the output stream once; reopen only if the format changes"""
+        with self._stream_lock:
+            stream = self._stream
+            if stream is not None and (
+                stream.samplerate != sample_rate or stream.channels != channels
+            ):
+                stream.stop()
+                stream.close()
+                stream = None
             
-            # sounddevice expects float32 in [-1, 1]
-            audio_np = audio_np.astype(np.float32) / 32768.0
+            if stream is None:
+                stream = get_audio_backend().OutputStream(
+                    samplerate=sample_rate,
+                    channels=channels,
+                    dtype="float32"
+                )
+                stream.start()
+                self._stream = stream
             
-            print(f"Playing audio...")
-            sd.play(audio_np, sample_rate)
-            sd.wait()
+            return stream
+    
+    def play(self, audio_np, sample_rate):
+        """Play float32 audio, blocking until it has been handed to the device"""
+        channels = 1 if audio_np.ndim == 1 else audio_np.shape[1]
+        stream = self._get_output_stream(sample_rate, channels)
+        stream.write(np.ascontiguousarray(audio_np, dtype=np.float32).reshape(-1, channels))
+    
+    def output_latency(self):
+        """Seconds of written audio the output stream may still hold (0 if unknown)"""
+        with self._stream_lock:
+            latency = getattr(self._stream, "latency", 0.0)
+        return latency if isinstance(latency, (int, float)) else 0.0
+
+    def stop_playback(self):
+        """Drop audio already handed to the device (barge-in); reopened on next play()"""
+        with self._stream_lock:
+            if self._stream is not None:
+                self._stream.abort()
+                self._stream.close()
+                self._stream = None
+    
+    def close(self):
+        """Release the audio output stream"""
+        with self._stream_lock:
+            if self._stream is not None:
+                self._stream.stop()
+                self._stream.close()
+                self._stream = None
     
     def set_language(self, language):
         """Set default language"""
@@ -0,0 +1,203 @@
+import queue
+import threading
+import time
+
+try:
+    from resource_manager import resources  # repo-level CPU budget (optional)
+except ImportError:
+    resources = None
+
+try:
+    from latency_tracer import tracer  # per-stage turn timing (optional)
+except ImportError:
+    tracer = None
+
+_STOP = object()
+
+# Speaking rate assumed for a sentence still being synthesized, until
+# finished sentences give a measured one
+DEFAULT_SECONDS_PER_CHAR = 1 / 15
+
+
+class SpeechPipeline:
+    """
+    Staged text-to-speech pipeline:
+
+        submit() -> sentence queue -> synthesis worker
+                 -> audio queue    -> playback worker
+
+    Sentence N+1 is synthesized while sentence N is playing. Both queues
+    are bounded, so a fast producer blocks in submit() instead of piling
+    up text or rendered audio.
+
+    cancel() (barge-in) stops playback within one `block_ms` block and
+    makes both workers skip everything queued before it; take_spoken()
+    tells what the listener actually heard. A producer that may race
+    with cancel() reads `epoch` once and passes it to every submit().
+    """
+
+    def __init__(self, tts, max_pending_sentences=4, max_pending_audio=2, block_ms=50):
+        self.tts = tts
+        self.block_ms = block_ms
+        self._sentences = queue.Queue(maxsize=max_pending_sentences)
+        self._audio = queue.Queue(maxsize=max_pending_audio)
+        self._threads = []
+
+        # Items carry the epoch they were submitted in; cancel() bumps it
+        self._epoch = 0
+        self._spoken = []             # sentences played to the end
+        self._current = None          # [text, samples played, samples received, sample_rate]
+        self._seconds_per_char = DEFAULT_SECONDS_PER_CHAR
+
+    def start(self):
+        """Start the synthesis and playback workers"""
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._synthesis_worker, daemon=True),
+            threading.Thread(target=self._playback_worker, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def epoch(self):
+        """Current cancel generation; speech submitted with an older one is dropped"""
+        return self._epoch
+
+    def submit(self, text, language=None, epoch=None):
+        """
+        Queue a sentence for speech (blocks while the queue is full).
+        `epoch`: the one read when the reply started (default: now).
+        """
+        text = text.strip()
+        if text:
+            self._sentences.put((self._epoch if epoch is None else epoch, text, language))
+
+    def cancel(self):
+        """Stop speaking now and drop all queued speech (safe from any thread)"""
+        self._epoch += 1
+
+    def take_spoken(self):
+        """
+        Text played since the last call. A sentence cut off by cancel()
+        is kept up to the share of its words already heard: played audio
+        over the sentence's expected length (it may still have been
+        synthesizing), rounded down.
+        """
+        spoken = list(self._spoken)
+        if self._current is not None:
+            text, played, received, sample_rate = self._current
+            words = text.split()
+            expected = max(received, len(text) * self._seconds_per_char * sample_rate)
+            heard = int(len(words) * played / expected) if expected else 0
+            if heard:
+                spoken.append(" ".join(words[:heard]))
+
+        self._spoken, self._current = [], None
+        return " ".join(spoken)
+
+    def wait(self):
+        """Block until every submitted sentence has been played (or dropped)"""
+        self._sentences.join()
+        self._audio.join()
+
+    def close(self):
+        """Finish pending speech and stop the workers"""
+        if not self._threads:
+            return
+        self._sentences.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --------------------------------------------------
+
+    def _synthesis_worker(self):
+        if resources is not None:
+            resources.apply("tts")
+        while True:
+            item = self._sentences.get()
+            try:
+                if item is _STOP:
+                    self._audio.put(_STOP)
+                    return
+
+                epoch, text, language = item
+                if epoch != self._epoch:
+                    continue  # cancelled before synthesis started
+
+                # Hand each chunk to playback as soon as Piper renders it
+                sample_rate = self.tts.get_sample_rate(language)
+                chunks = self.tts.synthesize_pcm(text, language=language)
+
+                # Synthesis time excludes waiting for room in the audio queue
+                synth_s, samples = 0.0, 0
+                while epoch == self._epoch:
+                    start = time.perf_counter()
+                    audio = next(chunks, None)
+                    synth_s += time.perf_counter() - start
+                    if audio is None:
+                        # End of sentence marker: playback counts it as spoken
+                        self._audio.put((epoch, None, sample_rate, text))
+                        break
+                    samples += len(audio)
+                    self._audio.put((epoch, audio, sample_rate, text))
+
+                if tracer is not None and samples:
+                    tracer.add_sentence(len(text), synth_s, samples / sample_rate, language)
+            except Exception as e:
+                print(f"TTS synthesis error: {e}")
+            finally:
+                self._sentences.task_done()
+
+    def _playback_worker(self):
+        while True:
+            item = self._audio.get()
+            try:
+                if item is _STOP:
+                    return
+
+                epoch, audio, sample_rate, text = item
+                if epoch != self._epoch:
+                    continue
+
+                if self._current is None or self._current[0] != text:
+                    self._current = [text, 0, 0, sample_rate]
+                if audio is None:
+                    self._spoken.append(text)
+                    self._learn_rate(text, self._current[2] / sample_rate)
+                    self._current = None
+                    continue
+
+                self._current[2] += len(audio)
+                if tracer is not None:
+                    tracer.mark("first_audio")
+
+                # Small writes, so cancel() takes effect within one block
+                block = max(1, int(sample_rate * self.block_ms / 1000))
+                for start in range(0, len(audio), block):
+                    if epoch != self._epoch:
+                        # The device's buffer was written but never heard
+                        buffered = int(self.tts.output_latency() * sample_rate)
+                        self._current[1] = max(0, self._current[1] - buffered)
+                        self.tts.stop_playback()  # discard what the device still holds
+                        break
+                    self.tts.play(audio[start:start + block], sample_rate)
+                    self._current[1] += len(audio[start:start + block])
+            except Exception as e:
+                print(f"TTS playback error: {e}")
+            finally:
+                self._audio.task_done()
+
+    def _learn_rate(self, text, seconds):
+        """Running speaking rate of finished sentences (for take_spoken())"""
+        if text and seconds > 0:
+            self._seconds_per_char = 0.8 * self._seconds_per_char + 0.2 * seconds / len(text)
@@ -0,0 +1,142 @@
+SENTENCE_END = ".!?।"
+CLAUSE_END = ",;:"
+
+# Words before which a long sentence may be split
+CONJUNCTIONS = {"and", "but", "or", "so", "because", "which", "then", "while"}
+
+# "Dr. Rao" is not a sentence end
+ABBREVIATIONS = {
+    "dr", "mr", "mrs", "ms", "prof", "sr", "jr", "st", "vs", "etc",
+    "e.g", "i.e", "fig", "approx",
+}
+
+# Abbreviations only before a number: "No. 5", but "... yes or no."
+NUMBER_ABBREVIATIONS = {"no"}
+
+
+class TextChunker:
+    """
+    Splits streamed LLM text into speakable chunks.
+
+    push() only scans the text added since the previous call. A chunk
+    ends at a sentence end (not inside "3.14", "Dr." or "e.g.") once it
+    is at least `min_chars` long. Sentences longer than `max_chars` are
+    split at the last clause boundary (comma/semicolon or before a
+    conjunction), else at a space. The first chunk of a reply uses the
+    smaller `first_min_chars`/`first_max_chars` and may end at a clause,
+    so speech starts as early as possible.
+    """
+
+    def __init__(self, min_chars=20, max_chars=150, first_min_chars=8, first_max_chars=60):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_min_chars = first_min_chars
+        self.first_max_chars = first_max_chars
+        self.reset()
+
+    def reset(self):
+        """Start a new reply (the next chunk is a "first" chunk again)"""
+        self.buffer = ""
+        self.first = True
+        self._pos = 0            # next index of buffer to scan
+        self._clause_cut = None  # best clause split point so far
+        self._space_cut = None   # last word boundary so far
+
+    def push(self, text):
+        """Add streamed text; returns the chunks that are now complete"""
+        self.buffer += text
+        chunks = []
+
+        # A boundary needs one character of lookahead
+        while self._pos < len(self.buffer) - 1:
+            i = self._pos
+            if self._awaiting_number(i):
+                break  # "No." + space: the next word decides
+            self._pos += 1
+
+            cut = self._boundary(i)
+            if cut is None and self._pos >= self._limit(self.max_chars, self.first_max_chars):
+                cut = self._fallback_cut()
+
+            if cut is not None:
+                chunk = self._emit(cut)
+                if chunk:
+                    chunks.append(chunk)
+
+        return chunks
+
+    def flush(self):
+        """End of reply: whatever is left, as a final chunk"""
+        chunk = self.buffer.strip()
+        self.reset()
+        return [chunk] if chunk else []
+
+    # --------------------------------------------------
+
+    def _limit(self, normal, first):
+        return first if self.first else normal
+
+    def _boundary(self, i):
+        """Cut position if a chunk may end right after buffer[i], else None"""
+        ch, nxt = self.buffer[i], self.buffer[i + 1]
+
+        if ch == "\n" or (ch in SENTENCE_END and nxt.isspace() and not self._is_abbreviation(i)):
+            if self._length(i) >= self._limit(self.min_chars, self.first_min_chars):
+                return i + 1
+            self._clause_cut = i + 1
+            return None
+
+        if not nxt.isspace():
+            return None
+
+        if ch in CLAUSE_END:
+            if self.first and self._length(i) >= self.first_min_chars:
+                return i + 1
+            self._clause_cut = i + 1
+        else:
+            start = self._word_start(i)
+            if start > 0 and self.buffer[start:i + 1].lower() in CONJUNCTIONS:
+                self._clause_cut = start
+            self._space_cut = i + 1
+        return None
+
+    def _fallback_cut(self):
+        """Over max length: last clause boundary, else last space, else here"""
+        min_chars = self._limit(self.min_chars, self.first_min_chars)
+        if self._clause_cut is not None and self._clause_cut >= min_chars:
+            return self._clause_cut
+        return self._space_cut or self._pos
+
+    def _length(self, i):
+        """Length of the chunk that would end at buffer[i]"""
+        return len(self.buffer[:i + 1].strip())
+
+    def _word_start(self, i):
+        while i > 0 and (self.buffer[i - 1].isalpha() or self.buffer[i - 1] == "."):
+            i -= 1
+        return i
+
+    def _is_abbreviation(self, i):
+        word = self.buffer[self._word_start(i):i]
+        if len(word) == 1 and word.isupper():
+            return True  # initials: "A. P. J."
+        if word.lower() in NUMBER_ABBREVIATIONS:
+            return self.buffer[i + 1:].lstrip()[:1].isdigit()
+        return word.lower() in ABBREVIATIONS
+
+    def _awaiting_number(self, i):
+        """A "No." whose following word has not streamed in yet"""
+        if self.buffer[i] != "." or self.buffer[i + 1:].strip():
+            return False
+        word = self.buffer[self._word_start(i):i]
+        return word.lower() in NUMBER_ABBREVIATIONS
+
+    def _emit(self, cut):
+        chunk = self.buffer[:cut].strip()
+        self.buffer = self.buffer[cut:]
+        self._pos -= cut
+        self._clause_cut = None
+        self._space_cut = None
+        if chunk:
+            self.first = False
+        return chunk
@@ -1,18 +1,17 @@
 import sys
 from pathlib import Path
-import sounddevice as sd
 import numpy as np
-import soundfile as sf
 import time
-import torch
 
 # --------------------------------------------------
 # Path setup
 # --------------------------------------------------
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root.parent))  # repo root (model_registry)
 
-from src.hybrid_stt import HybridSTT
+from src.vad_segmenter import VADSegmenter
+from model_registry import registry
 
 # --------------------------------------------------
 # Audio config (Silero-compatible)
@@ -22,71 +21,69 @@ CHANNELS = 1
 
 VAD_FRAME_SAMPLES = 512        # REQUIRED by Silero for 16 kHz
 SILENCE_FRAMES = 15            # ~0.5 sec of silence (15 * 32ms)
-TMP_WAV = "vad_input.wav"
+PRE_ROLL_MS = 300              # kept before speech start (first syllable)
+MAX_UTTERANCE_S = 30.0         # hard cap per utterance
+BARGE_IN_THRESHOLD = 0.8       # stricter while the bot is talking
+BARGE_IN_FRAMES = 6            # ~200 ms of speech interrupts the bot
 
-# --------------------------------------------------
-# Load Silero VAD
-# --------------------------------------------------
-print("Loading Silero VAD...")
-vad_model, utils = torch.hub.load(
-    repo_or_dir="snakers4/silero-vad",
-    model="silero_vad",
-    trust_repo=True
-)
-vad_model.eval()
-
-# --------------------------------------------------
-# Init STT
-# --------------------------------------------------
-stt = HybridSTT()
+# Silero VAD and the STT models come from the shared registry: nothing
+# is loaded at import time, and nothing is loaded twice.
+_segmenter = None
 
 # --------------------------------------------------
 
 
-def record_with_vad():
+def get_segmenter():
     """
-    Records audio until speech ends using Silero VAD.
+    Shared always-on VAD segmenter: the mic stream is opened once and
+    kept alive across turns.
     """
-    print("🎙️ Listening... (start speaking)")
-
-    audio_buffer = []
-    silence_counter = 0
-    speaking = False
-
-    stream = sd.InputStream(
-        samplerate=SAMPLE_RATE,
-        channels=CHANNELS,
-        blocksize=VAD_FRAME_SAMPLES,
-        dtype="float32"
-    )
-
-    with stream:
-        while True:
-            block, _ = stream.read(VAD_FRAME_SAMPLES)
-            block = block[:, 0]  # mono
-
-            audio_buffer.append(block)
-
-            audio_tensor = torch.from_numpy(block).unsqueeze(0)
-
-            speech_prob = vad_model(audio_tensor, SAMPLE_RATE).item()
+    global _segmenter
+    if _segmenter is None:
+        _segmenter = VADSegmenter(
+            registry.get("silero_vad"),
+            sample_rate=SAMPLE_RATE,
+            frame_samples=VAD_FRAME_SAMPLES,
+            silence_frames=SILENCE_FRAMES,
+            pre_roll_ms=PRE_ROLL_MS,
+            max_utterance_s=MAX_UTTERANCE_S,
+            barge_in_threshold=BARGE_IN_THRESHOLD,
+            barge_in_frames=BARGE_IN_FRAMES,
+        )
+        _segmenter.pause()
+        _segmenter.start()
+    return _segmenter
+
+
+def record_with_vad(keep_pending=False):
+    """
+    Returns the next utterance detected by Silero VAD.
 
-            if speech_prob > 0.5:
-                speaking = True
-                silence_counter = 0
-            else:
-                if speaking:
-                    silence_counter += 1
+    keep_pending: use speech captured before this call (a barge-in)
+    instead of discarding it.
+    """
+    print("🎙️ Listening... (start speaking)")
 
-            if speaking and silence_counter > SILENCE_FRAMES:
-                break
+    segmenter = get_segmenter()
+    if not keep_pending:
+        segmenter.clear()
+    segmenter.resume()
+    try:
+        audio = segmenter.get_segment()
+    finally:
+        # Ignore speech between turns (e.g. the bot's own voice)
+        segmenter.pause()
 
     print("🛑 Speech ended")
 
-    return np.concatenate(audio_buffer)
+    return audio
 
 
 def main():
+    registry.preload(["hybrid_stt", "silero_vad"])
+    registry.report()
+    stt = registry.get("hybrid_stt")
+
     print("\n=== LIVE MIC STT WITH VAD (FAST MODE) ===\n")
     print("Just start speaking. Ctrl+C to exit.\n")
 
@@ -97,10 +94,8 @@ def main():
             # Normalize
             audio = audio / max(1e-6, np.max(np.abs(audio)))
 
-            sf.write(TMP_WAV, audio, SAMPLE_RATE)
-
             start = time.time()
-            result = stt.transcribe(audio_path=TMP_WAV)
+            result = stt.transcribe(audio_array=audio, sample_rate=SAMPLE_RATE)
             end = time.time()
 
             print("-" * 60)
@@ -2,7 +2,8 @@ from .whisper_stt import WhisperSTT
 from .indic_stt import IndicSTT
 from .hybrid_stt import HybridSTT
 from .audio_processor import AudioProcessor
+from .vad_segmenter import VADSegmenter
 
 __version__ = "0.2.0"
-__all__ = ["WhisperSTT", "IndicSTT", "HybridSTT", "AudioProcessor"]
+__all__ = ["WhisperSTT", "IndicSTT", "HybridSTT", "AudioProcessor", "VADSegmenter"]
 
@@ -0,0 +1,110 @@
+import json
+from contextlib import contextmanager
+from pathlib import Path
+
+import torch
+from torch.overrides import TorchFunctionMode
+
+
+def artifacts_dir(config, config_path):
+    """
+    Local directory written by prepare_models.py. Relative paths in
+    config.yaml are resolved against the whisper_stt/ folder.
+    """
+    path = Path((config.get("artifacts") or {}).get("dir", "../models/stt"))
+    if not path.is_absolute():
+        path = Path(config_path).resolve().parent.parent / path
+    return path
+
+
+def warmup_enabled(config):
+    return (config.get("artifacts") or {}).get("warmup", True)
+
+
+class _SparseOnCpu(TorchFunctionMode):
+    """Sparse conversions have no meta kernel: give them a CPU placeholder"""
+
+    def __torch_function__(self, func, types, args=(), kwargs=None):
+        if func is torch.Tensor.to_sparse and args[0].is_meta:
+            return torch.zeros(args[0].shape, dtype=args[0].dtype, device="cpu").to_sparse()
+        return func(*args, **(kwargs or {}))
+
+
+@contextmanager
+def empty_weights():
+    """
+    Build modules on the meta device: no memory and no random
+    initialisation, since load_module() assigns every tensor from disk.
+    Only affects the calling thread (other loaders keep initialising).
+    """
+    with torch.device("meta"), _SparseOnCpu():
+        yield
+
+
+# --------------------------------------------------
+# torch modules <-> safetensors
+# --------------------------------------------------
+
+def save_module(module, path, metadata=None):
+    """
+    Write every parameter/buffer (including non-persistent buffers such
+    as whisper's alignment heads) to one .safetensors file, in the dtype
+    the module has now.
+    """
+    from safetensors.torch import save_file
+
+    tensors = {
+        name: tensor.detach().contiguous()
+        for name, tensor in module.state_dict().items()
+    }
+    for name, buffer in module.named_buffers():
+        if name not in tensors:
+            dense = buffer.to_dense() if buffer.is_sparse else buffer
+            tensors[name] = dense.detach().contiguous()
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_file(tensors, str(path), metadata={
+        key: json.dumps(value) for key, value in (metadata or {}).items()
+    })
+
+
+def read_metadata(path):
+    from safetensors import safe_open
+
+    with safe_open(str(path), framework="pt") as f:
+        return {key: json.loads(value) for key, value in (f.metadata() or {}).items()}
+
+
+def load_module(module, path):
+    """
+    Point module at the tensors in a save_module() file. The file is
+    memory-mapped and tensors are assigned as-is (no dtype conversion,
+    no second copy into freshly initialised weights).
+    """
+    from safetensors.torch import load_file
+
+    tensors = load_file(str(path))
+    state_keys = set(module.state_dict())
+
+    module.load_state_dict(
+        {k: v for k, v in tensors.items() if k in state_keys}, assign=True
+    )
+
+    # Non-persistent buffers are not part of state_dict()
+    for name, buffer in list(module.named_buffers()):
+        if name in state_keys or name not in tensors:
+            continue
+        owner_name, _, attr = name.rpartition(".")
+        owner = module.get_submodule(owner_name) if owner_name else module
+        value = tensors[name].to_sparse() if buffer.is_sparse else tensors[name]
+        owner.register_buffer(attr, value, persistent=False)
+
+    missing = [
+        name for name, tensor in list(module.named_parameters()) + list(module.named_buffers())
+        if tensor.is_meta
+    ]
+    if missing:
+        raise ValueError(f"{path} is missing tensors: {', '.join(missing[:5])}")
+
+    return module
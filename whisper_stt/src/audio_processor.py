@@ -1,8 +1,10 @@
-import sounddevice as sd
 import numpy as np
 import queue
 import threading
 
+from .audio_utils import get_audio_backend  # audio_io, else sounddevice
+
+
 class AudioProcessor:
     """Handle real-time audio input from microphone"""
     
@@ -22,7 +24,7 @@ class AudioProcessor:
     def start_recording(self):
         """Start recording from microphone"""
         self.is_recording = True
-        self.stream = sd.InputStream(
+        self.stream = get_audio_backend().InputStream(
             samplerate=self.sample_rate,
             channels=1,
             callback=self._audio_callback,
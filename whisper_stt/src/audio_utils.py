@@ -0,0 +1,43 @@
+import numpy as np
+
+try:
+    from audio_io import get_audio_backend  # pluggable mic/speaker (optional)
+except ImportError:
+    def get_audio_backend():
+        """Plain sounddevice when the repo-level audio_io is not importable"""
+        import sounddevice
+        return sounddevice
+
+TARGET_SAMPLE_RATE = 16000
+
+
+def to_mono_float32(audio, sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Convert an in-memory audio buffer into the format every engine expects:
+    mono float32 at 16 kHz.
+
+    Arrays that already match are returned without a copy, so the VAD
+    buffer can be shared by language detection and decoding.
+    """
+    if audio is None:
+        raise ValueError("Audio is None")
+
+    audio = np.asarray(audio)
+
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    elif audio.dtype != np.float32:
+        audio = audio.astype(np.float32)
+
+    # (frames, channels) -> mono
+    if audio.ndim == 2:
+        audio = audio.mean(axis=1, dtype=np.float32)
+
+    if sample_rate != TARGET_SAMPLE_RATE:
+        import librosa
+
+        audio = librosa.resample(
+            audio, orig_sr=sample_rate, target_sr=TARGET_SAMPLE_RATE
+        ).astype(np.float32)
+
+    return np.ascontiguousarray(audio)
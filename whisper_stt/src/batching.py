@@ -0,0 +1,108 @@
+import queue
+import threading
+import time
+
+
+class _Request:
+    __slots__ = ("item", "result", "error", "done")
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects calls from many threads into batches for one worker thread.
+
+    submit() blocks the caller until its result is ready. The worker
+    waits at most `max_wait_ms` after the first request for more to
+    arrive (up to `max_batch_size`), then calls `batch_fn(items)`, which
+    must return one result per item, in order. `on_start`, if given, runs
+    first on the worker thread (e.g. to apply a CPU budget).
+    """
+
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=20, name="batcher",
+                 on_start=None):
+        self.batch_fn = batch_fn
+        self.on_start = on_start
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+
+        self._requests = queue.Queue()
+        self._thread = None
+
+        # simple counters for the startup/health report
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, item):
+        request = _Request(item)
+        self._requests.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+    # --------------------------------------------------
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._requests.put(None)  # stop after this batch
+                break
+            batch.append(request)
+
+        return batch
+
+    def _run(self):
+        if self.on_start is not None:
+            self.on_start()
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            try:
+                results = self.batch_fn([request.item for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                self.batches += 1
+                self.items += len(batch)
+                for request in batch:
+                    request.done.set()
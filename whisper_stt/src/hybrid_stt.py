@@ -1,7 +1,11 @@
 import os
+import queue
+import threading
+import time
 import yaml
 import whisper
 import torch
+import numpy as np
 from pathlib import Path
 
 
@@ -9,6 +13,58 @@ from pathlib import Path
 
 from .whisper_stt import WhisperSTT
 from .indic_stt import IndicSTT
+from .audio_utils import to_mono_float32
+from .artifacts import artifacts_dir, warmup_enabled
+
+try:
+    from resource_manager import resources  # repo-level CPU budget (optional)
+except ImportError:
+    resources = None
+
+try:
+    from latency_tracer import tracer  # per-stage turn timing (optional)
+except ImportError:
+    tracer = None
+
+# Live routing normalises the audio heard so far to this peak, so speech
+# up to twice as loud later on still fits in [-1, 1]
+LIVE_PEAK = 0.5
+
+
+def load_stt_config(config_path=None):
+    """-> (config dict, resolved config path)"""
+    # Resolve config path safely
+    if config_path is None:
+        base_dir = Path(__file__).resolve().parent.parent
+        config_path = base_dir / "config" / "config.yaml"
+
+    with open(config_path, "r") as f:
+        return yaml.safe_load(f), config_path
+
+
+def build_indic(config, config_path=None):
+    """
+    IndicSTT (CPU) configured from the `indic` section; loads the local
+    artifact from prepare_models.py when present.
+    """
+    indic_cfg = config["indic"]
+    model_path = indic_cfg["model_name"]
+
+    if config_path is not None:
+        local = artifacts_dir(config, config_path) / "indic"
+        if (local / "config.json").exists():
+            model_path = str(local)
+
+    indic = IndicSTT(
+        model_path=model_path,
+        device="cpu",
+        chunk_length_s=indic_cfg.get("chunk_length_s", 10.0),
+        stride_length_s=indic_cfg.get("stride_length_s", 2.0),
+        batch_size=indic_cfg.get("batch_size", 4)
+    )
+    if warmup_enabled(config):
+        indic.warmup()
+    return indic
 
 
 class HybridSTT:
@@ -19,19 +75,13 @@ class HybridSTT:
     1. Whisper language detection ONLY (no decoding)
     2. If English → Whisper decode
     3. Else → IndicSTT (Malayalam)
+
+    Already-loaded engines can be passed in (see model_registry.py) so
+    they are shared instead of loaded again.
     """
 
-    from pathlib import Path
-    
-    def __init__(self, config_path=None):
-        # Resolve config path safely
-        if config_path is None:
-            base_dir = Path(__file__).resolve().parent.parent
-            config_path = base_dir / "config" / "config.yaml"
-    
-        with open(config_path, "r") as f:
-            self.config = yaml.safe_load(f)
-    
+    def __init__(self, config_path=None, whisper_stt=None, indic_stt=None):
+        self.config, config_path = load_stt_config(config_path)
 
         print("=== Initializing Hybrid STT System (CPU MODE) ===")
 
@@ -41,55 +91,86 @@ class HybridSTT:
         self.device = "cpu"
 
         # Load Whisper ONCE (CPU)
-        print("\n1. Loading Whisper (language detect + English) [CPU] ...")
-        self.whisper = WhisperSTT(config_path)
+        if whisper_stt is None:
+            print("\n1. Loading Whisper (language detect + English) [CPU] ...")
+            whisper_stt = WhisperSTT(config_path)
+        self.whisper = whisper_stt
         self.whisper_model = self.whisper.model.to("cpu")
 
         # Load IndicSTT (CPU)
-        print("\n2. Loading IndicSTT (Malayalam) [CPU] ...")
-        indic_cfg = self.config["indic"]
-        self.indic = IndicSTT(
-            model_path=indic_cfg["model_name"],
-            device="cpu"
-        )
+        if indic_stt is None:
+            print("\n2. Loading IndicSTT (Malayalam) [CPU] ...")
+            indic_stt = build_indic(self.config, config_path)
+        self.indic = indic_stt
 
         self.current_engine = "indic"
 
     # --------------------------------------------------
 
-    def _detect_language_whisper(self, audio_path):
+    def _detect_language_whisper(self, audio):
         """
         FAST language detection using Whisper encoder only (CPU)
+
+        Returns (language, encoder_features); the features are reused for
+        English decoding so the encoder runs once per utterance.
         """
-        audio = whisper.load_audio(audio_path)
-        audio = whisper.pad_or_trim(audio)
+        start = time.perf_counter()
+        features = self.whisper.encode(audio)
+        lang, _ = self.whisper.detect_language(features)
 
-        mel = whisper.log_mel_spectrogram(audio).to("cpu")
+        if tracer is not None:
+            tracer.add("lid_ms", (time.perf_counter() - start) * 1000)
+        return lang, features
 
-        _, probs = self.whisper_model.detect_language(mel)
-        lang = max(probs, key=probs.get)
+    def start_utterance(self, on_partial=None):
+        """
+        Live transcription of the utterance about to be spoken: feed it
+        VAD audio as it arrives, then call finish() at the endpoint.
+        Language ID runs early (language_detection.early_after_s).
+        """
+        lid_cfg = self.config.get("language_detection") or {}
+        return LiveTranscription(
+            self,
+            early_after_s=lid_cfg.get("early_after_s", 1.5),
+            recheck_after_s=lid_cfg.get("recheck_after_s"),
+            streaming=lid_cfg.get("streaming", True),
+            on_partial=on_partial
+        )
 
-        return lang
+    def create_stream(self, language):
+        """Incremental recognizer for the engine that handles `language`"""
+        if language == "en":
+            return self.whisper.create_stream(language="en")
+        return self.create_indic_stream()
 
     # --------------------------------------------------
 
     def transcribe(self, audio_path=None, audio_array=None, sample_rate=16000):
         """
         Transcription logic:
+        - Decode audio ONCE (or take the VAD buffer as-is)
         - Detect language cheaply
-        - Decode ONLY with chosen engine
+        - Decode ONLY with chosen engine, reusing the same samples
         """
 
-        if audio_path is None:
-            raise ValueError("audio_path is required for fast mode")
+        if audio_array is not None:
+            audio = to_mono_float32(audio_array, sample_rate)
+        elif audio_path is not None:
+            audio = whisper.load_audio(str(audio_path))
+        else:
+            raise ValueError("Either audio_path or audio_array must be provided")
 
         # Step 1: FAST language detection (CPU)
-        detected_lang = self._detect_language_whisper(audio_path)
+        detected_lang, features = self._detect_language_whisper(audio)
 
         # Step 2: Routing
         if detected_lang == "en":
             print("Detected English: Using Whisper (CPU).")
-            result = self.whisper.transcribe_file(audio_path)
+            result = self.whisper.transcribe_decoded(
+                audio,
+                language="en",
+                audio_features=features
+            )
             result["engine"] = "whisper"
             result["language"] = "en"
             self.current_engine = "whisper"
@@ -98,16 +179,223 @@ class HybridSTT:
         # Step 3: Anything else → Malayalam
         print(f"Detected '{detected_lang}' (non-English): Using IndicSTT (CPU).")
         result = self.indic.transcribe(
-            audio_path=audio_path,
-            audio_array=None,
-            sample_rate=sample_rate
+            audio_array=audio,
+            sample_rate=16000
         )
         result["engine"] = "indic"
         result["language"] = "ml"
         self.current_engine = "indic"
         return result
 
+    def create_indic_stream(self):
+        """Streaming Malayalam recognizer configured from indic.stream_*"""
+        indic_cfg = self.config["indic"]
+        return self.indic.create_stream(
+            step_s=indic_cfg.get("stream_step_s", 0.5),
+            left_context_s=indic_cfg.get("stream_left_context_s", 2.0),
+            right_context_s=indic_cfg.get("stream_right_context_s", 0.5)
+        )
+
+    # --------------------------------------------------
+    # Batched helpers (multi-session server)
+    # --------------------------------------------------
+
+    def detect_language_batch(self, audios):
+        """
+        Route several utterances with ONE encoder pass.
+        Returns [(language, encoder_features)] in input order.
+        """
+        features = self.whisper.encode_batch(audios)
+        langs = self.whisper.detect_language_batch(features)
+
+        return [(lang, features[i:i + 1]) for i, lang in enumerate(langs)]
+
+    def transcribe_english_batch(self, items):
+        """
+        Decode several English utterances together.
+        items: [(audio, encoder_features)] as returned by detect_language_batch
+        """
+        results = [None] * len(items)
+        batch = []
+
+        for i, (audio, features) in enumerate(items):
+            if (len(audio) <= whisper.audio.N_SAMPLES
+                    and self.whisper._audio_sanity_check(audio)):
+                batch.append(i)
+            else:
+                results[i] = self.whisper.transcribe_decoded(
+                    audio, language="en", audio_features=features
+                )
+
+        if batch:
+            decoded = self.whisper.decode_features_batch(
+                torch.cat([items[i][1] for i in batch]),
+                [len(items[i][0]) / whisper.audio.SAMPLE_RATE for i in batch],
+                language="en"
+            )
+            for i, result in zip(batch, decoded):
+                results[i] = result
+
+        for result in results:
+            result["engine"] = "whisper"
+            result["language"] = "en"
+        return results
+
     # --------------------------------------------------
 
     def get_current_engine(self):
         return self.current_engine
+
+
+class LiveTranscription:
+    """
+    Routes and decodes one utterance while it is still being spoken.
+
+    feed() is cheap and safe to call from the VAD thread; a worker thread
+    runs Whisper language ID once `early_after_s` of speech has arrived
+    (and again at `recheck_after_s`, if set), then feeds the chosen
+    engine's streaming recognizer. finish() only has the tail left to
+    decode. Utterances shorter than `early_after_s` fall back to
+    HybridSTT.transcribe().
+
+    The streams need one fixed gain, chosen when language ID first runs
+    from the audio heard so far: it brings that peak to LIVE_PEAK (quiet
+    mics included) and nothing is clipped. If later speech is louder
+    than that headroom allows, finish() decodes the whole utterance
+    peak-normalised instead, like the offline path.
+    """
+
+    def __init__(self, stt, early_after_s=1.5, recheck_after_s=None,
+                 streaming=True, on_partial=None):
+        self.stt = stt
+        self.early_samples = int(early_after_s * whisper.audio.SAMPLE_RATE)
+        self.recheck_samples = (
+            int(recheck_after_s * whisper.audio.SAMPLE_RATE)
+            if recheck_after_s else None
+        )
+        self.streaming = streaming
+        self.on_partial = on_partial
+
+        self.audio = np.zeros(0, dtype=np.float32)   # raw, as fed
+        self.gain = None
+        self.language = None
+        self.stream = None
+        self.rechecked = False
+        self.error = None
+        self.fed_samples = 0
+
+        self._chunks = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def feed(self, samples):
+        """Queue 16 kHz mono float32 audio (never blocks)"""
+        self.fed_samples += len(samples)
+        self._chunks.put(np.asarray(samples, dtype=np.float32))
+
+    def finish(self, timeout=None):
+        """Endpoint reached: return the final result dict"""
+        self._chunks.put(None)
+        self._thread.join(timeout)
+        if self.error is not None:
+            print(f"Live transcription failed ({self.error}); decoding offline.")
+
+        if self.language is None or self.error is not None:
+            # Too short to route early: the usual offline path
+            return self.stt.transcribe(audio_array=self._normalized(), sample_rate=16000)
+
+        if self.stream is not None and not self._outgrew_gain():
+            result = self.stream.finish()
+        elif self.language == "en":
+            result = self.stt.whisper.transcribe_decoded(self._normalized(), language="en")
+        else:
+            result = self.stt.indic.transcribe(audio_array=self._normalized(), sample_rate=16000)
+
+        return self._tag(result)
+
+    # --------------------------------------------------
+
+    def _normalized(self):
+        """Whole utterance, peak-normalised (as listen_and_transcribe used to)"""
+        return self.audio / max(1e-6, np.max(np.abs(self.audio), initial=0.0))
+
+    def _scaled(self, audio):
+        """Apply the gain fixed at routing time (no clipping)"""
+        return (audio * self.gain).astype(np.float32)
+
+    def _outgrew_gain(self):
+        """Later speech got louder than the routing-time headroom allows"""
+        return np.max(np.abs(self.audio), initial=0.0) * self.gain > 1.0
+
+    def _drain(self, block):
+        """All queued audio as one array; (audio, finished)"""
+        chunks, finished = [], False
+        while True:
+            try:
+                if block and not chunks:
+                    chunk = self._chunks.get(timeout=0.1)
+                else:
+                    chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                finished = True
+                break
+            chunks.append(chunk)
+
+        audio = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+        return audio, finished
+
+    def _run(self):
+        if resources is not None:
+            resources.apply("stt")
+        try:
+            finished = False
+            while not finished:
+                # Take everything queued so a slow pass never falls behind
+                chunk, finished = self._drain(block=True)
+                if not len(chunk):
+                    continue
+
+                self.audio = np.concatenate([self.audio, chunk])
+                if self._route():
+                    continue  # new stream was fed the whole buffer
+
+                if self.stream is not None:
+                    partial = self.stream.feed(self._scaled(chunk), decode=not finished)
+                    if partial is not None and self.on_partial is not None:
+                        self.on_partial(self._tag(partial))
+        except Exception as e:
+            self.error = e
+
+    def _route(self):
+        """Run (or re-run) language ID when due; True if the engine changed"""
+        n = len(self.audio)
+        due = self.language is None and n >= self.early_samples
+        recheck = (self.language is not None and not self.rechecked
+                   and self.recheck_samples is not None and n >= self.recheck_samples)
+        if not (due or recheck):
+            return False
+
+        self.rechecked = self.rechecked or recheck
+        if self.gain is None:
+            self.gain = LIVE_PEAK / max(1e-6, np.max(np.abs(self.audio), initial=0.0))
+        lang, _ = self.stt._detect_language_whisper(self._scaled(self.audio))
+        lang = "en" if lang == "en" else "ml"
+        if lang == self.language:
+            return False
+
+        if self.language is not None:
+            print(f"Language re-check: {self.language} -> {lang}")
+        self.language = lang
+
+        self.stream = self.stt.create_stream(lang) if self.streaming else None
+        if self.stream is not None:
+            self.stream.feed(self._scaled(self.audio), decode=False)
+        return True
+
+    def _tag(self, result):
+        result["engine"] = "whisper" if self.language == "en" else "indic"
+        result["language"] = self.language
+        self.stt.current_engine = result["engine"]
+        return result
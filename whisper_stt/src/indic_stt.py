@@ -1,18 +1,32 @@
+import time
 import torch
 from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
 import numpy as np
 import librosa
 
+from .audio_utils import to_mono_float32
+
+DEFAULT_MODEL_NAME = "gvs/wav2vec2-large-xlsr-malayalam"
+
 
 class IndicSTT:
     """Malayalam speech recognition using Wav2Vec2"""
     
-    def __init__(self, model_path=None, device="cuda"):
-        """Initialize Malayalam STT model"""
+    def __init__(self, model_path=None, device="cuda",
+                 chunk_length_s=10.0, stride_length_s=2.0, batch_size=4):
+        """
+        Initialize Malayalam STT model
+        
+        Args:
+            chunk_length_s: Window size for long inputs (seconds)
+            stride_length_s: Overlap on each side of a window (seconds)
+            batch_size: Windows per forward pass
+        """
         self.device = device if torch.cuda.is_available() else "cpu"
+        self.batch_size = batch_size
         
-        # Use public Malayalam model
-        model_name = "gvs/wav2vec2-large-xlsr-malayalam"
+        # Public Malayalam model, or a local directory from prepare_models.py
+        model_name = model_path or DEFAULT_MODEL_NAME
         
         print(f"Loading Malayalam STT model: {model_name}")
         print(f"Using device: {self.device}")
@@ -21,8 +35,33 @@ class IndicSTT:
         self.processor = Wav2Vec2Processor.from_pretrained(model_name)
         self.model = Wav2Vec2ForCTC.from_pretrained(model_name).to(self.device)
         
+        # Samples per CTC frame (product of the conv feature-extractor strides)
+        self.samples_per_frame = int(np.prod(self.model.config.conv_stride))
+        
+        # Window/stride in samples, aligned to whole CTC frames
+        self.chunk_samples = self._to_frames(chunk_length_s) * self.samples_per_frame
+        self.stride_samples = self._to_frames(stride_length_s) * self.samples_per_frame
+        if self.chunk_samples <= 2 * self.stride_samples:
+            raise ValueError("chunk_length_s must be more than twice stride_length_s")
+        
         print("Malayalam STT model loaded successfully!")
     
+    def _to_frames(self, seconds):
+        return int(round(seconds * 16000 / self.samples_per_frame))
+    
+    def save_artifact(self, path):
+        """Write processor + model (safetensors) for offline, mmap-friendly loading"""
+        self.model.save_pretrained(str(path), safe_serialization=True)
+        self.processor.save_pretrained(str(path))
+        return path
+    
+    def warmup(self):
+        """One tiny forward pass, so the first request is not the slow one"""
+        start = time.perf_counter()
+        audio = np.random.RandomState(0).randn(16000).astype(np.float32) * 0.01
+        self._forward([audio])
+        print(f"IndicSTT warm-up: {time.perf_counter() - start:.2f} s")
+    
     def transcribe(self, audio_path=None, audio_array=None, sample_rate=16000):
         """
         Transcribe audio to Malayalam text
@@ -39,32 +78,178 @@ class IndicSTT:
         if audio_path:
             audio, sr = librosa.load(audio_path, sr=16000)
         elif audio_array is not None:
-            audio = audio_array
-            if sample_rate != 16000:
-                audio = librosa.resample(audio, orig_sr=sample_rate, target_sr=16000)
+            audio = to_mono_float32(audio_array, sample_rate)
         else:
             raise ValueError("Either audio_path or audio_array must be provided")
         
-        # Process audio
-        inputs = self.processor(audio, sampling_rate=16000, return_tensors="pt", padding=True)
-        
-        # Move to device
-        input_values = inputs.input_values.to(self.device)
-        
-        # Transcribe
-        with torch.no_grad():
-            logits = self.model(input_values).logits
+        # Transcribe (windowed for long inputs)
+        logits = self._logits(audio)
         
         # Decode
         predicted_ids = torch.argmax(logits, dim=-1)
-        transcription = self.processor.batch_decode(predicted_ids)[0]
+        transcription = self.processor.batch_decode(predicted_ids.unsqueeze(0))[0]
         
         return {
             'text': transcription,
             'language': 'ml'
         }
     
-    def transcribe_stream(self, audio_chunk, sample_rate=16000):
-        """Transcribe audio chunk for streaming"""
-        return self.transcribe(audio_array=audio_chunk, sample_rate=sample_rate)
+    def _forward(self, windows):
+        """Batched forward pass -> list of (frames, vocab) logits, padding removed"""
+        inputs = self.processor(
+            windows, sampling_rate=16000, return_tensors="pt", padding=True
+        )
+        
+        kwargs = {}
+        if "attention_mask" in inputs:
+            kwargs["attention_mask"] = inputs.attention_mask.to(self.device)
+        
+        with torch.no_grad():
+            logits = self.model(inputs.input_values.to(self.device), **kwargs).logits
+        
+        lengths = [
+            int(self.model._get_feat_extract_output_lengths(len(w)))
+            for w in windows
+        ]
+        return [logits[i, :n] for i, n in enumerate(lengths)]
+    
+    def _logits(self, audio):
+        """
+        CTC logits for the whole utterance.
+        
+        Short inputs go through the model in one pass. Longer ones are cut
+        into overlapping windows (chunk + stride on each side), run in
+        batches, and only the centre of each window is kept, so memory
+        stays bounded and cost grows linearly with length.
+        """
+        if len(audio) <= self.chunk_samples:
+            return self._forward([audio])[0]
+        
+        step = self.chunk_samples - 2 * self.stride_samples
+        spf = self.samples_per_frame
+        
+        # (window, first kept frame, last kept frame) in window-local frames
+        windows, spans = [], []
+        for start in range(0, len(audio), step):
+            end = min(start + step, len(audio))
+            win_start = max(0, start - self.stride_samples)
+            win_end = min(len(audio), end + self.stride_samples)
+            
+            windows.append(audio[win_start:win_end])
+            spans.append(((start - win_start) // spf, (end - win_start) // spf))
+        
+        pieces = []
+        for i in range(0, len(windows), self.batch_size):
+            batch = self._forward(windows[i:i + self.batch_size])
+            for logits, (first, last) in zip(batch, spans[i:i + self.batch_size]):
+                pieces.append(logits[first:last])
+        
+        return torch.cat(pieces)
+    
+    def _decode_ids(self, ids):
+        if not ids:
+            return ""
+        return self.processor.batch_decode(torch.tensor([ids]))[0]
+    
+    def create_stream(self, step_s=0.5, left_context_s=2.0, right_context_s=0.5):
+        """New stateful recognizer for one utterance at a time (see IndicStream)"""
+        return IndicStream(self, step_s, left_context_s, right_context_s)
+
+
+class IndicStream:
+    """
+    Incremental CTC recognition of one utterance while it is spoken.
+    
+    Audio is appended as it arrives. Every `step_s` of new audio the model
+    runs over a sliding window: `left_context_s` of already-decoded audio
+    plus everything after it. CTC frames older than `right_context_s` from
+    the end are committed and never recomputed; the rest are a tentative
+    tail. Each pass therefore costs about the same no matter how long the
+    student talks, and finish() only has the last few hundred ms left.
+    """
+    
+    def __init__(self, stt, step_s=0.5, left_context_s=2.0, right_context_s=0.5):
+        self.stt = stt
+        spf = stt.samples_per_frame
+        self.step_samples = stt._to_frames(step_s) * spf
+        self.left_samples = stt._to_frames(left_context_s) * spf
+        self.right_samples = stt._to_frames(right_context_s) * spf
+        self.reset()
+    
+    def reset(self):
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.offset = 0          # absolute index of audio[0]
+        self.committed = 0       # absolute sample index decoded for good
+        self.committed_ids = []
+        self.tentative_ids = []
+        self._since_pass = 0
+    
+    @property
+    def total_samples(self):
+        return self.offset + len(self.audio)
+    
+    def feed(self, audio_chunk, sample_rate=16000, decode=True):
+        """
+        Append audio; returns a partial result when a new pass ran:
+        {'text', 'stable_text', 'language', 'final': False}
+        
+        decode=False only buffers (e.g. the tail right before finish()).
+        """
+        chunk = to_mono_float32(audio_chunk, sample_rate)
+        self.audio = np.concatenate([self.audio, chunk])
+        self._since_pass += len(chunk)
+        
+        if not decode or self._since_pass < self.step_samples:
+            return None
+        
+        self._since_pass = 0
+        spf = self.stt.samples_per_frame
+        stable_end = (self.total_samples - self.right_samples) // spf * spf
+        self._decode(stable_end)
+        return self._result(final=False)
+    
+    def finish(self):
+        """Decode what is left, return the final result and reset"""
+        if self.total_samples > self.committed:
+            self._decode(self.total_samples)
+        
+        result = self._result(final=True)
+        self.reset()
+        return result
+    
+    # --------------------------------------------------
+    
+    def _decode(self, stable_end):
+        spf = self.stt.samples_per_frame
+        win_start = max(self.offset, self.committed - self.left_samples)
+        window = self.audio[win_start - self.offset:]
+        if len(window) < spf:
+            return
+        
+        logits = self.stt._forward([window])[0]
+        ids = torch.argmax(logits, dim=-1).tolist()
+        
+        first = (self.committed - win_start) // spf
+        split = max(first, (stable_end - win_start) // spf)
+        
+        self.committed_ids.extend(ids[first:split])
+        self.tentative_ids = ids[split:]
+        self.committed = max(self.committed, win_start + split * spf)
+        
+        # Audio older than the left context is never needed again
+        keep_from = max(self.offset, self.committed - self.left_samples)
+        self.audio = self.audio[keep_from - self.offset:]
+        self.offset = keep_from
+    
+    def _result(self, final):
+        stable = self.stt._decode_ids(self.committed_ids)
+        text = stable if final else self.stt._decode_ids(
+            self.committed_ids + self.tentative_ids
+        )
+        return {
+            'text': text,
+            'stable_text': stable,
+            'language': 'ml',
+            'final': final
+        }
 
@@ -1,26 +1,44 @@
 import sys
 from pathlib import Path
 import time
-import numpy as np
-import soundfile as sf
 
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root.parent))  # repo root (model_registry)
 
-from src.hybrid_stt import HybridSTT
-from examples.live_mic_vad_stt import record_with_vad, SAMPLE_RATE
+from examples.live_mic_vad_stt import record_with_vad, get_segmenter
+from model_registry import registry
 
-TMP_WAV = "vad_input.wav"
 
-stt = HybridSTT()
+def get_stt():
+    """Shared HybridSTT, built on first use (see model_registry.py)"""
+    return registry.get("hybrid_stt")
 
-def listen_and_transcribe():
-    audio = record_with_vad()
-    audio = audio / max(1e-6, np.max(np.abs(audio)))
-    sf.write(TMP_WAV, audio, SAMPLE_RATE)
+
+def listen_and_transcribe(keep_pending=False):
+    """
+    keep_pending: the student barged in while the bot was talking; their
+    speech is already being captured and must not be discarded.
+    """
+    # Route + decode while the student is still talking; only the tail
+    # is left to decode once the VAD endpoint fires.
+    live = get_stt().start_utterance()
+    segmenter = get_segmenter()
+    # Detached by the segmenter at the endpoint, so frames of the next
+    # utterance never reach this (finished) transcription
+    sink = live.feed
+    segmenter.attach_speech_sink(sink)
+    try:
+        audio = record_with_vad(keep_pending=keep_pending)
+    finally:
+        segmenter.detach_speech_sink(sink)
+
+    if not live.fed_samples:
+        # A barge-in that had already ended before we started listening
+        live.feed(audio)
 
     start = time.time()
-    result = stt.transcribe(audio_path=TMP_WAV)
+    result = live.finish()
     latency = time.time() - start
 
     return {
@@ -0,0 +1,360 @@
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+try:
+    from resource_manager import resources  # repo-level CPU budget (optional)
+except ImportError:
+    resources = None
+
+try:
+    from latency_tracer import tracer  # per-stage turn timing (optional)
+except ImportError:
+    tracer = None
+
+from .audio_utils import get_audio_backend  # audio_io, else sounddevice
+
+
+def load_silero_vad(artifact_path=None, warmup=True):
+    """
+    Silero VAD without network access when possible: a TorchScript file
+    written by prepare_models.py, else the pip `silero-vad` package, else
+    torch.hub (downloads on first use).
+    """
+    if artifact_path is not None and Path(artifact_path).exists():
+        vad_model = torch.jit.load(str(artifact_path), map_location="cpu")
+    else:
+        try:
+            from silero_vad import load_silero_vad as load_packaged
+            vad_model = load_packaged()
+        except ImportError:
+            vad_model, _ = torch.hub.load(
+                repo_or_dir="snakers4/silero-vad",
+                model="silero_vad",
+                trust_repo=True
+            )
+    vad_model.eval()
+
+    if warmup:
+        with torch.no_grad():
+            vad_model(torch.zeros(1, 512), 16000)
+        if hasattr(vad_model, "reset_states"):
+            vad_model.reset_states()
+    return vad_model
+
+
+class RingBuffer:
+    """Fixed-size float32 audio ring buffer addressed by absolute sample index"""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=np.float32)
+        self.total_written = 0  # absolute index of the next sample
+
+    def write(self, samples):
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            self.total_written += n - self.capacity
+            n = self.capacity
+
+        start = self.total_written % self.capacity
+        first = min(n, self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:n - first] = samples[first:]
+        self.total_written += n
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still held"""
+        return max(0, self.total_written - self.capacity)
+
+    def read(self, start, end=None):
+        """Copy samples [start, end) out of the buffer (absolute indices)"""
+        end = self.total_written if end is None else end
+        start = max(start, self.oldest)
+        n = end - start
+        if n <= 0:
+            return np.zeros(0, dtype=np.float32)
+
+        i = start % self.capacity
+        first = min(n, self.capacity - i)
+        return np.concatenate([
+            self.buffer[i:i + first],
+            self.buffer[:n - first]
+        ])
+
+
+class VADSegmenter:
+    """
+    Always-on Silero VAD segmenter.
+
+    One capture stream stays open across turns. The audio callback only
+    copies blocks into a bounded queue; a worker thread runs Silero and
+    writes into a fixed-size ring buffer, so memory never grows with
+    silence. Finished utterances (with pre-roll) are delivered through
+    get_segment() and/or the on_segment callback.
+
+    For streaming recognition, on_speech_audio(samples) is called on the
+    worker thread with the pre-roll when speech starts and then with every
+    frame until the endpoint, so a recognizer can decode while the user is
+    still talking. Keep it cheap (hand off to another thread if needed).
+    A callback attached mid-utterance first receives what it missed.
+    attach_speech_sink() sets it for one utterance only: it is detached
+    at that utterance's endpoint, so it never sees the next one.
+
+    Barge-in: while paused (the bot is talking), `barge_in_frames`
+    consecutive frames above the stricter `barge_in_threshold` call
+    on_barge_in() and start an utterance anyway, so the interruption is
+    captured rather than lost. Without echo cancellation use a headset,
+    or the bot's own voice may trigger it.
+    """
+
+    def __init__(
+        self,
+        vad_model,
+        sample_rate=16000,
+        frame_samples=512,        # REQUIRED by Silero for 16 kHz
+        threshold=0.5,
+        silence_frames=15,        # ~0.5 sec of silence (15 * 32ms)
+        pre_roll_ms=300,
+        max_utterance_s=30.0,
+        on_segment=None,
+        max_pending_blocks=256,
+        on_speech_audio=None,
+        on_barge_in=None,
+        barge_in_threshold=0.8,
+        barge_in_frames=6,        # ~200 ms of confident speech
+    ):
+        self.vad_model = vad_model
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.threshold = threshold
+        self.silence_frames = silence_frames
+        self.pre_roll_samples = int(sample_rate * pre_roll_ms / 1000)
+        self.max_utterance_samples = int(sample_rate * max_utterance_s)
+        self.on_segment = on_segment
+        self.on_speech_audio = on_speech_audio
+        self._sink_once = False
+        self._sink_lock = threading.Lock()  # on_speech_audio changes vs. delivery
+        self.on_barge_in = on_barge_in
+        self.barge_in_threshold = barge_in_threshold
+        self.barge_in_frames = barge_in_frames
+
+        # Pre-roll + the longest utterance always fit, so an utterance in
+        # progress is never overwritten.
+        self.ring = RingBuffer(self.pre_roll_samples + self.max_utterance_samples)
+
+        self.segments = queue.Queue()
+        self._blocks = queue.Queue(maxsize=max_pending_blocks)
+        self.dropped_blocks = 0
+
+        self._stream = None
+        self._worker = None
+        self._running = threading.Event()
+        self._listening = threading.Event()
+        self._listening.set()
+
+        self._reset_utterance()
+
+    # --------------------------------------------------
+
+    def _reset_utterance(self):
+        self.speaking = False
+        self._speech_start = None
+        self._silence_counter = 0
+        self._delivered = None     # on_speech_audio has audio up to here
+        self._barge_in_count = 0
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """sounddevice callback: copy the block and return immediately"""
+        if status:
+            print(f"Audio status: {status}")
+        try:
+            self._blocks.put_nowait(indata[:, 0].copy())
+        except queue.Full:
+            self.dropped_blocks += 1
+
+    # --------------------------------------------------
+
+    def start(self):
+        """Open the capture stream (once) and start the VAD worker"""
+        if self._running.is_set():
+            return
+
+        self._running.set()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+        self._stream = get_audio_backend().InputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            blocksize=self.frame_samples,
+            dtype="float32",
+            callback=self._audio_callback
+        )
+        self._stream.start()
+
+    def stop(self):
+        """Close the capture stream and stop the worker"""
+        if not self._running.is_set():
+            return
+
+        self._running.clear()
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        self._worker.join(timeout=1.0)
+        self._worker = None
+
+    def pause(self):
+        """
+        Keep capturing (the ring buffer stays warm) but do not start new
+        segments, e.g. while the bot itself is talking.
+        """
+        self._listening.clear()
+
+    def resume(self):
+        self._listening.set()
+
+    def attach_speech_sink(self, callback):
+        """on_speech_audio for the current / next utterance only"""
+        with self._sink_lock:
+            self.on_speech_audio = callback
+            self._sink_once = True
+
+    def detach_speech_sink(self, callback):
+        """Remove `callback` if still attached; no call reaches it afterwards"""
+        with self._sink_lock:
+            if self.on_speech_audio is callback:
+                self.on_speech_audio = None
+                self._sink_once = False
+
+    def get_segment(self, timeout=None):
+        """Block until the next finished speech segment is available"""
+        return self.segments.get(timeout=timeout)
+
+    def clear(self):
+        """Drop any finished segments that have not been consumed yet"""
+        while True:
+            try:
+                self.segments.get_nowait()
+            except queue.Empty:
+                return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --------------------------------------------------
+
+    def _run(self):
+        if resources is not None:
+            resources.apply("vad")
+        pending = np.zeros(0, dtype=np.float32)
+
+        while self._running.is_set():
+            try:
+                block = self._blocks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            # Silero needs exactly frame_samples per call
+            pending = np.concatenate([pending, block]) if len(pending) else block
+            while len(pending) >= self.frame_samples:
+                frame = pending[:self.frame_samples]
+                pending = pending[self.frame_samples:]
+                self._process_frame(frame)
+
+    def _process_frame(self, frame):
+        self.ring.write(frame)
+
+        start = time.perf_counter()
+        with torch.no_grad():
+            speech_prob = self.vad_model(
+                torch.from_numpy(frame).unsqueeze(0), self.sample_rate
+            ).item()
+        if tracer is not None:
+            tracer.add("vad_compute_ms", (time.perf_counter() - start) * 1000)
+            tracer.add("vad_audio_ms", len(frame) * 1000 / self.sample_rate)
+
+        listening = self._listening.is_set()
+        if tracer is not None and listening and speech_prob > self.threshold:
+            tracer.mark("vad_last_speech", overwrite=True)
+
+        if not self.speaking:
+            if speech_prob > self.threshold and listening:
+                if tracer is not None:
+                    tracer.mark("vad_speech_start")
+                self._start_utterance(len(frame))
+            elif self._is_barge_in(speech_prob, listening):
+                self._start_utterance(len(frame) * self.barge_in_frames)
+                self.on_barge_in()
+
+            if self.speaking:
+                self._deliver()
+            return
+
+        self._deliver()
+
+        if speech_prob > self.threshold:
+            self._silence_counter = 0
+        else:
+            self._silence_counter += 1
+
+        length = self.ring.total_written - self._speech_start
+        if (self._silence_counter > self.silence_frames
+                or length >= self.max_utterance_samples):
+            self._emit()
+
+    def _is_barge_in(self, speech_prob, listening):
+        """Paused, and sustained confident speech"""
+        if self.on_barge_in is None or listening or speech_prob <= self.barge_in_threshold:
+            self._barge_in_count = 0
+            return False
+        self._barge_in_count += 1
+        return self._barge_in_count >= self.barge_in_frames
+
+    def _start_utterance(self, speech_samples):
+        """Speech began `speech_samples` ago; keep pre-roll before that"""
+        self.speaking = True
+        self._silence_counter = 0
+        self._barge_in_count = 0
+        speech_start = self.ring.total_written - speech_samples
+        self._speech_start = max(self.ring.oldest, speech_start - self.pre_roll_samples)
+        self._delivered = self._speech_start
+
+    def _deliver(self):
+        """Everything on_speech_audio has not seen yet (backlog if attached late)"""
+        with self._sink_lock:
+            callback = self.on_speech_audio
+            if callback is None:
+                return
+            callback(self.ring.read(self._delivered))
+        self._delivered = self.ring.total_written
+
+    def _emit(self):
+        if tracer is not None:
+            tracer.mark("vad_end")
+        segment = self.ring.read(self._speech_start)
+        self._reset_utterance()
+
+        with self._sink_lock:
+            if self._sink_once:
+                self.on_speech_audio = None
+                self._sink_once = False
+
+        if hasattr(self.vad_model, "reset_states"):
+            self.vad_model.reset_states()
+
+        self.segments.put(segment)
+        if self.on_segment is not None:
+            self.on_segment(segment)
@@ -0,0 +1,71 @@
+import torch
+import whisper
+
+from .artifacts import empty_weights, load_module, read_metadata
+
+
+# ----------------------------------------
+
+
+def load_whisper_artifact(path):
+    """Prepared FP32 weights: memory-mapped, no download, no conversion"""
+    dims = whisper.model.ModelDimensions(**read_metadata(path)["dims"])
+    with empty_weights():
+        model = whisper.model.Whisper(dims)
+    return load_module(model, path).eval()
+
+
+def _load_float32(size, device, artifact_path):
+    """Plain float32 (prepared artifact when present)"""
+    if artifact_path is not None and artifact_path.exists():
+        print(f"Loading Whisper '{size}' from {artifact_path} ...")
+        return load_whisper_artifact(artifact_path).to(device)
+
+    print(f"Loading Whisper '{size}' model on {device} (FP32 forced)...")
+
+    # Load model normally (no dtype argument)
+    model = whisper.load_model(size, device=device)
+
+    # 🔒 FORCE FP32 AFTER LOADING
+    return model.float().eval()
+
+
+def _load_int8(size, device, artifact_path):
+    """float32 weights with int8 dynamic quantization of Linear layers (CPU)"""
+    if device != "cpu":
+        print("⚠️ int8 Whisper runs on CPU only; ignoring device "
+              f"'{device}'")
+    model = _load_float32(size, "cpu", artifact_path)
+
+    # whisper.model.Linear only casts its weights to the input dtype; in
+    # FP32 it is nn.Linear, which quantize_dynamic matches by exact type.
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+
+    # In place: each fp32 Linear is freed as it is quantized
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+COMPUTE_TYPES = {
+    "float32": _load_float32,
+    "int8": _load_int8,
+}
+
+
+def resolve_compute_type(name):
+    name = name or "float32"
+    if name not in COMPUTE_TYPES:
+        raise ValueError(
+            f"Unknown Whisper compute_type '{name}' "
+            f"(choose from: {', '.join(COMPUTE_TYPES)})"
+        )
+    return name
+
+
+def load_whisper_model(size, compute_type="float32", device="cpu", artifact_path=None):
+    """Build a Whisper model for the given compute_type (see config.yaml)"""
+    compute_type = resolve_compute_type(compute_type)
+    return COMPUTE_TYPES[compute_type](size, device, artifact_path)
@@ -1,35 +1,98 @@
+import dataclasses
+import threading
+import time
 import whisper
 import torch
 import yaml
 import numpy as np
 
+from .audio_utils import to_mono_float32
+from .artifacts import artifacts_dir, save_module, warmup_enabled
+from .whisper_backends import load_whisper_model, resolve_compute_type
+
+# Defaults used by whisper's transcribe(); applied when decoding
+# directly from cached encoder features (overridable under
+# performance.fallback in config.yaml).
+FALLBACK_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+STREAM_MIN_NEW_TOKENS = 64  # decode room a stream keeps after a long prefix
+
+
+def save_whisper_artifact(model, path):
+    """Write a loaded Whisper model (in its current dtype) + dims to safetensors"""
+    save_module(model, path, metadata={"dims": dataclasses.asdict(model.dims)})
+    return path
+
 
 class WhisperSTT:
     """
     Speech-to-Text engine using OpenAI Whisper
-    FP32-forced (compatible with older whisper versions)
+    float32 or int8 (CPU) weights, picked by model.compute_type;
+    decoding always runs with fp16 disabled
     """
 
-    def __init__(self, config_path="config/config.yaml"):
+    def __init__(self, config_path="config/config.yaml", compute_type=None):
+        """compute_type: overrides model.compute_type in the config"""
         with open(config_path, 'r') as f:
             self.config = yaml.safe_load(f)
 
         model_config = self.config['model']
 
         self.device = model_config['device'] if torch.cuda.is_available() else "cpu"
+        self.compute_type = resolve_compute_type(
+            compute_type or model_config.get('compute_type')
+        )
 
-        print(f"Loading Whisper '{model_config['size']}' model on {self.device} (FP32 forced)...")
+        self.artifact_path = (
+            artifacts_dir(self.config, config_path)
+            / "whisper" / f"{model_config['size']}.safetensors"
+        )
 
-        # Load model normally (no dtype argument)
-        self.model = whisper.load_model(
+        self.model = load_whisper_model(
             model_config['size'],
-            device=self.device
+            compute_type=self.compute_type,
+            device=self.device,
+            artifact_path=self.artifact_path,
+        )
+        self.device = str(self.model.device)
+
+        print(f"Model loaded successfully ({self.compute_type})!")
+
+        # Tiered decoding: greedy first, beam search only when unsure
+        perf = self.config['performance']
+        fallback = perf.get('fallback') or {}
+        self.decoding = perf.get('decoding', 'beam')
+        self.logprob_threshold = fallback.get('logprob_threshold', LOGPROB_THRESHOLD)
+        self.compression_ratio_threshold = fallback.get(
+            'compression_ratio_threshold', COMPRESSION_RATIO_THRESHOLD
         )
+        self.no_speech_threshold = fallback.get('no_speech_threshold', NO_SPEECH_THRESHOLD)
+        self.decode_stats = {"greedy_decodes": 0, "beam_fallbacks": 0}
+        self._stats_lock = threading.Lock()  # server threads decode concurrently
 
-        # 🔒 FORCE FP32 AFTER LOADING
-        self.model = self.model.float()
+        if warmup_enabled(self.config):
+            self.warmup()
+
+    # --------------------------------------------------
+
+    def warmup(self):
+        """One tiny encoder + decoder pass, so the first request is not the slow one"""
+        start = time.perf_counter()
+        audio = (np.random.RandomState(0).randn(whisper.audio.SAMPLE_RATE) * 0.01)
+        features = self.encode(audio.astype(np.float32))
+
+        options = whisper.DecodingOptions(
+            language="en",
+            without_timestamps=True,
+            sample_len=4,
+            fp16=False,  # 🔒 HARD DISABLE FP16
+        )
+        with torch.no_grad():
+            whisper.decode(self.model, features, options)
 
-        print("Model loaded successfully (FP32, stable mode)!")
+        print(f"Whisper warm-up: {time.perf_counter() - start:.2f} s")
 
     # --------------------------------------------------
 
@@ -47,38 +110,191 @@ class WhisperSTT:
 
     # --------------------------------------------------
 
-    def transcribe_file(self, audio_path, language=None):
-        language = language or self.config['model']['language']
-        audio_path = str(audio_path)
+    def encode(self, audio):
+        """
+        Run the Whisper encoder ONCE on (the first 30 s of) decoded audio.
 
-        audio = whisper.load_audio(audio_path)
+        The returned features can be shared by detect_language() and
+        transcribe_decoded(), so routing and English decoding cost a
+        single encoder pass.
+        """
+        return self.encode_batch([audio])
 
-        if not self._audio_sanity_check(audio):
-            return {
-                "text": "",
-                "segments": [],
-                "language": "unknown"
-            }
+    def encode_batch(self, audios):
+        """Encoder pass over several utterances at once -> (B, ctx, state)"""
+        n_mels = getattr(self.model.dims, "n_mels", 80)
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+
+        with torch.no_grad():
+            return self.model.embed_audio(mels)
+
+    # --------------------------------------------------
+
+    def detect_language(self, audio_features):
+        """Language ID on pre-computed encoder features (no encoder pass)"""
+        with torch.no_grad():
+            # 2-D input -> single result; the encoder is skipped because
+            # the shape already matches (n_audio_ctx, n_audio_state)
+            _, probs = self.model.detect_language(audio_features[0])
+
+        return max(probs, key=probs.get), probs
 
-        result = self.model.transcribe(
-            audio_path,
+    def detect_language_batch(self, audio_features):
+        """Language ID for every row of a (B, ctx, state) feature batch"""
+        with torch.no_grad():
+            _, probs = self.model.detect_language(audio_features)
+
+        return [max(p, key=p.get) for p in probs]
+
+    # --------------------------------------------------
+
+    def _decode_window(self, audio_features, temperature, language, beam_size=None):
+        """One whisper.decode() call over a batch of encoder features (greedy unless beam_size)"""
+        perf = self.config['performance']
+
+        if temperature > 0:
+            strategy = {"best_of": perf['best_of']}
+        else:
+            strategy = {"beam_size": beam_size}
+
+        options = whisper.DecodingOptions(
             language=language,
+            temperature=temperature,
+            without_timestamps=True,
             fp16=False,  # 🔒 HARD DISABLE FP16
-            beam_size=self.config['performance']['beam_size'],
-            best_of=self.config['performance']['best_of']
+            **strategy
         )
+        return whisper.decode(self.model, audio_features, options)
+
+    def _confident(self, avg_logprob, compression_ratio, no_speech_prob):
+        """model.transcribe()'s rule for accepting a decode without fallback"""
+        if (no_speech_prob > self.no_speech_threshold
+                and avg_logprob < self.logprob_threshold):
+            return True  # silence: no retry, _to_result() drops it
+        return (compression_ratio <= self.compression_ratio_threshold
+                and avg_logprob >= self.logprob_threshold)
 
+    def _decode_ok(self, result):
+        return self._confident(result.avg_logprob, result.compression_ratio, result.no_speech_prob)
+
+    def _record_tier(self, fell_back):
+        with self._stats_lock:
+            self.decode_stats["greedy_decodes"] += 1
+            if fell_back:
+                self.decode_stats["beam_fallbacks"] += 1
+
+    def decoding_report(self):
+        """How often tiered decoding had to fall back to beam search"""
+        with self._stats_lock:
+            decodes = self.decode_stats["greedy_decodes"]
+            fallbacks = self.decode_stats["beam_fallbacks"]
         return {
-            "text": result.get("text", ""),
-            "segments": result.get("segments", []),
-            "language": result.get("language", "unknown")
+            "decoding": self.decoding,
+            "greedy_decodes": decodes,
+            "beam_fallbacks": fallbacks,
+            "fallback_rate": fallbacks / decodes if decodes else 0.0,
         }
 
+    def _to_result(self, result, duration, language):
+        # Same silence rule as model.transcribe(): skipped unless the
+        # decode is confident (avg_logprob above the threshold)
+        if (result.no_speech_prob > self.no_speech_threshold
+                and result.avg_logprob <= self.logprob_threshold):
+            text, segments = "", []
+        else:
+            text = result.text
+            segments = [{
+                "id": 0,
+                "start": 0.0,
+                "end": duration,
+                "text": result.text,
+                "tokens": result.tokens,
+                "temperature": result.temperature,
+                "avg_logprob": result.avg_logprob,
+                "compression_ratio": result.compression_ratio,
+                "no_speech_prob": result.no_speech_prob,
+            }]
+
+        return {
+            "text": text,
+            "segments": segments,
+            "language": result.language or language or "unknown"
+        }
+
+    def _decode_features(self, audio_features, duration, language):
+        """
+        Decode a single 30 s window from encoder features, with the same
+        temperature fallback model.transcribe() applies per segment.
+        """
+        return self.decode_features_batch(audio_features, [duration], language)[0]
+
+    def decode_features_batch(self, audio_features, durations, language):
+        """
+        Decode one 30 s window per row of audio_features. The first
+        (temperature 0) pass runs as a single batch: greedy in tiered mode,
+        else beam search. Rows that fail the quality checks are re-decoded
+        one by one: with beam search (tiered mode), then through higher
+        temperatures.
+        """
+        beam_size = self.config['performance']['beam_size']
+        tiered = self.decoding == "tiered"
+        results = self._decode_window(
+            audio_features, FALLBACK_TEMPERATURES[0], language,
+            beam_size=None if tiered else beam_size
+        )
+
+        for i, result in enumerate(results):
+            ok = self._decode_ok(result)
+            if tiered:
+                self._record_tier(not ok)
+            if not ok:
+                results[i] = self._fallback(audio_features[i:i + 1], language, try_beam=tiered)
+
+        return [
+            self._to_result(result, duration, language)
+            for result, duration in zip(results, durations)
+        ]
+
+    def _fallback(self, audio_features, language, try_beam):
+        """
+        Re-decode one window that failed the checks: beam search (unless
+        the first pass already was), then higher temperatures.
+        """
+        result = None
+        if try_beam:
+            result = self._decode_window(
+                audio_features, 0.0, language,
+                beam_size=self.config['performance']['beam_size']
+            )[0]
+
+        for temperature in FALLBACK_TEMPERATURES[1:]:
+            if result is not None and self._decode_ok(result):
+                break
+            result = self._decode_window(audio_features, temperature, language)[0]
+        return result
+
     # --------------------------------------------------
 
-    def transcribe_array(self, audio_array, sample_rate=16000, language=None):
+    def transcribe_file(self, audio_path, language=None):
+        # Decode once (ffmpeg) and hand the samples to Whisper directly,
+        # instead of letting model.transcribe() decode the path again.
+        audio = whisper.load_audio(str(audio_path))
+        return self.transcribe_decoded(audio, language=language)
+
+    # --------------------------------------------------
+
+    def transcribe_decoded(self, audio, language=None, audio_features=None):
+        """
+        Transcribe mono float32 16 kHz audio that is already in memory,
+        using the decoding settings from config.yaml.
+
+        If audio_features from encode() are given and the audio fits in one
+        30 s window, the encoder is not run again.
+        """
         language = language or self.config['model']['language']
-        audio = np.asarray(audio_array, dtype=np.float32)
 
         if not self._audio_sanity_check(audio):
             return {
@@ -87,14 +303,244 @@ class WhisperSTT:
                 "language": "unknown"
             }
 
-        result = self.model.transcribe(
-            audio,
-            language=language,
-            fp16=False  # 🔒 HARD DISABLE FP16
-        )
+        if audio_features is not None and len(audio) <= whisper.audio.N_SAMPLES:
+            return self._decode_features(
+                audio_features,
+                duration=len(audio) / whisper.audio.SAMPLE_RATE,
+                language=language
+            )
+
+        result = self._transcribe_long(audio, language)
 
         return {
             "text": result.get("text", ""),
             "segments": result.get("segments", []),
             "language": result.get("language", "unknown")
         }
+
+    def _transcribe_long(self, audio, language):
+        """
+        model.transcribe() (any length). Tiered mode runs it greedily at
+        temperature 0 only, then re-decodes just the 30 s windows that
+        failed the checks (see _redecode_weak_windows).
+        """
+        perf = self.config['performance']
+        options = dict(
+            language=language,
+            fp16=False,  # 🔒 HARD DISABLE FP16
+            best_of=perf['best_of'],
+            logprob_threshold=self.logprob_threshold,
+            compression_ratio_threshold=self.compression_ratio_threshold,
+            no_speech_threshold=self.no_speech_threshold
+        )
+
+        if self.decoding == "tiered":
+            # No temperature sweep here: weak windows get beam search first
+            result = self.model.transcribe(audio, beam_size=None, temperature=0.0, **options)
+            return self._redecode_weak_windows(audio, result, language)
+
+        return self.model.transcribe(audio, beam_size=perf['beam_size'], **options)
+
+    def _redecode_weak_windows(self, audio, result, language):
+        """
+        Segments of one decoding window share its `seek` and quality
+        figures; a window that fails the checks is cut out of the audio
+        (from its first segment's start to its last segment's end) and
+        decoded again with beam search, then higher temperatures.
+        """
+        windows = {}
+        for segment in result.get("segments", []):
+            windows.setdefault(segment["seek"], []).append(segment)
+
+        language = language or result.get("language")
+        segments = []
+        for seek, group in windows.items():
+            first = group[0]
+            fell_back = not self._confident(
+                first["avg_logprob"], first["compression_ratio"], first["no_speech_prob"]
+            )
+            self._record_tier(fell_back)
+            if not fell_back:
+                segments.extend(group)
+                continue
+
+            start, end = group[0]["start"], group[-1]["end"]
+            clip = audio[int(start * whisper.audio.SAMPLE_RATE):int(end * whisper.audio.SAMPLE_RATE)]
+            if not len(clip):
+                continue
+            decoded = self._to_result(
+                self._fallback(self.encode(clip), language, try_beam=True), end - start, language
+            )
+            for segment in decoded["segments"]:
+                segments.append(dict(segment, seek=seek, start=start, end=end))
+
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+        return dict(
+            result,
+            segments=segments,
+            text=" ".join(s["text"].strip() for s in segments if s["text"].strip()),
+        )
+
+    # --------------------------------------------------
+
+    def transcribe_array(self, audio_array, sample_rate=16000, language=None):
+        """Any in-memory buffer (converted to mono 16 kHz); same decoding as transcribe_file"""
+        audio = to_mono_float32(audio_array, sample_rate)
+        return self.transcribe_decoded(audio, language=language)
+
+    # --------------------------------------------------
+
+    def create_stream(self, language=None):
+        """New incremental recognizer (see WhisperStream), tuned by whisper.stream_*"""
+        stream_cfg = self.config.get('whisper') or {}
+        return WhisperStream(
+            self,
+            language=language or self.config['model']['language'],
+            step_s=stream_cfg.get('stream_step_s', 1.0),
+            agreement=stream_cfg.get('stream_agreement', 2)
+        )
+
+
+class WhisperStream:
+    """
+    Incremental Whisper transcription of one utterance while it is spoken.
+
+    Every `step_s` of new audio the whole buffer is re-decoded greedily,
+    with the already committed words forced as the decoder prefix. A word
+    is committed once `agreement` consecutive passes produce it
+    (LocalAgreement), so partials never flicker backwards. At the endpoint
+    finish() runs one pass that only has to extend the committed prefix:
+    greedy in tiered mode (beam search only if it looks unreliable),
+    else beam search.
+    """
+
+    def __init__(self, stt, language=None, step_s=1.0, agreement=2):
+        self.stt = stt
+        self.language = language
+        self.step_samples = int(step_s * whisper.audio.SAMPLE_RATE)
+        self.agreement = max(1, agreement)
+        self.reset()
+
+    def reset(self):
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.committed_words = []
+        self.hypotheses = []          # last `agreement` word lists
+        self.detected_language = self.language
+        self._since_pass = 0
+
+    def feed(self, audio_chunk, sample_rate=16000, decode=True):
+        """
+        Append audio; returns a partial result when a new pass ran:
+        {'text', 'stable_text', 'language', 'final': False}
+
+        decode=False only buffers (e.g. the tail right before finish()).
+        """
+        chunk = to_mono_float32(audio_chunk, sample_rate)
+        self.audio = np.concatenate([self.audio, chunk])
+        self._since_pass += len(chunk)
+
+        # Past one 30 s window the final pass takes the long-form path
+        if (not decode
+                or self._since_pass < self.step_samples
+                or len(self.audio) > whisper.audio.N_SAMPLES
+                or not self.stt._audio_sanity_check(self.audio)):
+            return None
+
+        self._since_pass = 0
+        result = self._decode(beam_size=None)
+        words = self.committed_words + result.text.split()
+
+        self.hypotheses = (self.hypotheses + [words])[-self.agreement:]
+        if len(self.hypotheses) == self.agreement:
+            agreed = self._common_prefix(self.hypotheses)
+            self.committed_words.extend(agreed[len(self.committed_words):])
+
+        return {
+            "text": " ".join(words),
+            "stable_text": " ".join(self.committed_words),
+            "language": self.detected_language or "unknown",
+            "final": False
+        }
+
+    def finish(self):
+        """Final transcript for the buffered utterance; resets the stream"""
+        audio = self.audio
+        duration = len(audio) / whisper.audio.SAMPLE_RATE
+
+        if len(audio) > whisper.audio.N_SAMPLES or not self.stt._audio_sanity_check(audio):
+            result = self.stt.transcribe_decoded(audio, language=self.detected_language)
+        else:
+            decoded = self._final_pass()
+            if self.stt._decode_ok(decoded):
+                result = self.stt._to_result(decoded, duration, self.detected_language)
+                if result["text"] or self.committed_words:
+                    result["text"] = " ".join(
+                        self.committed_words + decoded.text.split()
+                    )
+            else:
+                # Prefix led the decoder astray: fall back to a clean decode
+                result = self.stt.transcribe_decoded(audio, language=self.detected_language)
+
+        result["final"] = True
+        self.reset()
+        return result
+
+    # --------------------------------------------------
+
+    def _final_pass(self):
+        beam_size = self.stt.config['performance']['beam_size']
+        if self.stt.decoding != "tiered":
+            return self._decode(beam_size=beam_size)
+
+        decoded = self._decode(beam_size=None)
+        fell_back = not self.stt._decode_ok(decoded)
+        self.stt._record_tier(fell_back)
+        return self._decode(beam_size=beam_size) if fell_back else decoded
+
+    def _decode(self, beam_size):
+        features = self.stt.encode(self.audio)
+
+        # Prefix + new tokens stay within half the text context: only the
+        # newest committed tokens are forced (the window slides), and the
+        # sample length shrinks as the prefix grows
+        half = self.stt.model.dims.n_text_ctx // 2
+        prefix = self._prefix_tokens()[-(half - STREAM_MIN_NEW_TOKENS):]
+
+        options = whisper.DecodingOptions(
+            language=self.detected_language,
+            temperature=0.0,
+            without_timestamps=True,
+            prefix=prefix or None,
+            sample_len=half - len(prefix),
+            beam_size=beam_size,
+            fp16=False,  # 🔒 HARD DISABLE FP16
+        )
+        with torch.no_grad():
+            result = whisper.decode(self.stt.model, features, options)[0]
+
+        # Detect once, then keep the language fixed for later passes
+        if self.detected_language is None:
+            self.detected_language = result.language
+        return result
+
+    def _prefix_tokens(self):
+        if not self.committed_words:
+            return []
+        model = self.stt.model
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual,
+            num_languages=model.num_languages,
+            language=self.detected_language,
+            task="transcribe"
+        )
+        return tokenizer.encode(" " + " ".join(self.committed_words))
+
+    @staticmethod
+    def _common_prefix(hypotheses):
+        prefix = []
+        for words in zip(*hypotheses):
+            if any(w != words[0] for w in words):
+                break
+            prefix.append(words[0])
+        return prefix